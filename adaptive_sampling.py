@@ -0,0 +1,55 @@
+import numpy as np
+
+from instrumentation import traced
+
+
+adaptiveSettings = {
+    "tolerance": 1e-3,
+    "initialSamples": 64,
+    "maxSamples": 4096,
+    "maxIterations": 20,
+    "horizonOffset": 1e-6
+}
+
+
+@traced("adaptiveRadii")
+def adaptiveRadii(function, schwarzRadius, minRadius, maxRadius, settings=adaptiveSettings):
+    # Radii for plotting function(r) between minRadius and maxRadius. Outside
+    # the horizon samples start log-spaced in r - rs, then every interval whose
+    # midpoint is further than the tolerance (relative to the curve value) from
+    # the straight line drawn between its ends is split, until the curve is
+    # resolved or maxSamples is reached. Inside the horizon the helpers return
+    # a constant, so only the ends of that stretch are kept.
+    schwarzRadius = float(schwarzRadius)
+    start = max(minRadius, schwarzRadius * (1 + settings["horizonOffset"]))
+    if start >= maxRadius:
+        radii = np.linspace(minRadius, maxRadius, 2)
+        return radii, function(radii)
+
+    radii = schwarzRadius + np.geomspace(start - schwarzRadius, maxRadius - schwarzRadius, settings["initialSamples"])
+    values = function(radii)
+
+    for _ in range(settings["maxIterations"]):
+        budget = settings["maxSamples"] - radii.size
+        if budget <= 0:
+            break
+        left, right = radii[:-1], radii[1:]
+        middle = schwarzRadius + np.sqrt((left - schwarzRadius) * (right - schwarzRadius))
+        middleValues = function(middle)
+        fraction = (middle - left) / (right - left)
+        linear = values[:-1] + fraction * (values[1:] - values[:-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error = np.abs(middleValues - linear) / np.maximum(np.abs(middleValues), np.finfo(float).tiny)
+        refine = np.flatnonzero(error > settings["tolerance"])
+        if refine.size == 0:
+            break
+        if refine.size > budget:
+            refine = np.sort(refine[np.argsort(error[refine])[::-1][:budget]])
+        radii = np.insert(radii, refine + 1, middle[refine])
+        values = np.insert(values, refine + 1, middleValues[refine])
+
+    if minRadius < schwarzRadius:
+        inside = np.array([minRadius, schwarzRadius * (1 - 1e-12)])
+        radii = np.concatenate((inside, radii))
+        values = np.concatenate((function(inside), values))
+    return radii, values
@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+# Runs compute(parameters, cancelled) on a background thread once requests have
+# been quiet for `delay` seconds, then hands the newest finished result to
+# publish(parameters, result) on the GUI thread through a canvas timer. If
+# preview(parameters) is given, a cheaper version of every new request is
+# computed and published straight away while the full one is debounced.
+class DebouncedRecompute:
+    def __init__(self, figure, compute, publish, delay=0.15, pollInterval=30, preview=None):
+        self.compute = compute
+        self.publish = publish
+        self.delay = delay
+        self.preview = preview
+        self.previewedGeneration = 0
+        self.generation = 0
+        self.parameters = None
+        self.requestTime = 0
+        self.result = None
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+        self.timer = figure.canvas.new_timer(interval=pollInterval)
+        self.timer.add_callback(self._poll)
+        self.timer.start()
+        figure.canvas.mpl_connect("close_event", lambda event: self.stop())
+
+    def request(self, parameters):
+        with self.condition:
+            self.generation += 1
+            self.parameters = parameters
+            self.requestTime = time.monotonic()
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.generation += 1
+            self.condition.notify()
+        self.timer.stop()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while self.running and self.parameters is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation = self.generation
+                parameters = self.parameters
+                if self.preview is not None and self.previewedGeneration != generation:
+                    self.previewedGeneration = generation
+                    parameters = self.preview(parameters)
+                else:
+                    remaining = self.requestTime + self.delay - time.monotonic()
+                    if remaining > 0:
+                        self.condition.wait(remaining)
+                        continue
+                    self.parameters = None
+
+            result = self.compute(parameters, lambda: self.generation != generation)
+            if result is None:
+                continue
+            with self.condition:
+                if self.generation == generation:
+                    self.result = (parameters, result)
+
+    def _poll(self):
+        with self.condition:
+            finished = self.result
+            self.result = None
+        if finished is not None:
+            self.publish(*finished)
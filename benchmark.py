@@ -0,0 +1,205 @@
+import matplotlib
+matplotlib.use("Agg")
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from helpers import schwarzchildDilation, gravitationalRedshift, properTime, redshiftedWavelength, solarMassToKg, schwarzchildRadius
+from spacetime_curve import spacetimeData, getSpaceCurveInfo, spaceCurveParameters, drawSpaceCurveSubplots, spaceCurveArtists
+from time_animation import build_time_comparison
+
+
+BENCHMARK_MASS = 7.2301112487166
+KERNEL_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7, 10**8]
+GRID_COUNTS = [15, 50, 200]
+GEO_SAMPLES = [500, 2000, 8000]
+
+
+def measure(function, repeats=5, warmup=1):
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": statistics.median(timings), "best": min(timings), "peakBytes": peak}
+
+
+def kernelBenchmarks(maxSize, repeats):
+    rng = np.random.default_rng(0)
+    massKg = solarMassToKg(BENCHMARK_MASS)
+    sRadius = schwarzchildRadius(massKg)
+    kernels = {
+        "schwarzchildDilation": lambda radii: schwarzchildDilation(massKg, radii),
+        "gravitationalRedshift": lambda radii: gravitationalRedshift(massKg, radii),
+        "properTime": lambda radii: properTime(1.0, massKg, radii),
+        "redshiftedWavelength": lambda radii: redshiftedWavelength(656.3e-9, massKg, radii),
+    }
+    for size in (size for size in KERNEL_SIZES if size <= maxSize):
+        radii = rng.uniform(0.5 * sRadius, 20 * sRadius, size)
+        for name, kernel in kernels.items():
+            result = measure(lambda: kernel(radii), repeats)
+            result["throughput"] = size / result["seconds"]
+            result["unit"] = "elements/s"
+            yield f"kernel/{name}/{size}", result
+        del radii
+
+
+def spaceCurveBenchmarks(repeats):
+    for gridCount in GRID_COUNTS:
+        for geoSamples in GEO_SAMPLES:
+            for precision in ("float64", "float32"):
+                data = dict(spacetimeData, gridCount=gridCount, geoSamples=geoSamples, precision=precision,
+                            geoDelta=spacetimeData["geoDelta"] * spacetimeData["geoSamples"] / geoSamples)
+                result = measure(lambda: getSpaceCurveInfo(*spaceCurveParameters(data)), repeats)
+                result["throughput"] = 1 / result["seconds"]
+                result["unit"] = "solves/s"
+                suffix = "" if precision == "float64" else f"/{precision}"
+                yield f"getSpaceCurveInfo/grid{gridCount}/samples{geoSamples}{suffix}", result
+
+
+def newSpacetimeFigure():
+    figure = plt.figure(figsize=(12, 5))
+    axes = (figure.add_subplot(1, 3, 1), figure.add_subplot(1, 3, 2), figure.add_subplot(1, 3, 3, projection='3d'))
+    return figure, axes
+
+
+def redrawBenchmarks(repeats):
+    for gridCount in GRID_COUNTS:
+        figure, axes = newSpacetimeFigure()
+        dataSets = [dict(spacetimeData, gridCount=gridCount, viewRadius=spacetimeData["viewRadius"] + step)
+                    for step in (0, 1000)]
+        infos = [getSpaceCurveInfo(*spaceCurveParameters(data)) for data in dataSets]
+        counter = iter(range(10**9))
+
+        def fullRedraw():
+            index = next(counter) % 2
+            drawSpaceCurveSubplots(*axes, infos[index], dataSets[index])
+            figure.canvas.draw()
+
+        result = measure(fullRedraw, repeats)
+        result["throughput"] = 1 / result["seconds"]
+        result["unit"] = "redraws/s"
+        yield f"plotSpaceCurveSubplots/full/grid{gridCount}", result
+
+        geodesicSets = [dict(dataSets[0], x0=dataSets[0]["x0"] - step) for step in (0, 1000)]
+        geodesicInfos = [getSpaceCurveInfo(*spaceCurveParameters(data)) for data in geodesicSets]
+        drawSpaceCurveSubplots(*axes, geodesicInfos[0], geodesicSets[0])
+        figure.canvas.draw()
+        artists = spaceCurveArtists(*axes)
+
+        def geodesicRedraw():
+            index = next(counter) % 2
+            drawSpaceCurveSubplots(*axes, geodesicInfos[index], geodesicSets[index])
+            artists.blit()
+
+        result = measure(geodesicRedraw, repeats)
+        result["throughput"] = 1 / result["seconds"]
+        result["unit"] = "redraws/s"
+        yield f"plotSpaceCurveSubplots/geodesic/grid{gridCount}", result
+        plt.close(figure)
+
+
+def animationBenchmarks(repeats, frameCount=10000, framesPerRun=200):
+    figure, init, animate = build_time_comparison(BENCHMARK_MASS, frameCount)
+    canvas = figure.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+    frames = iter(range(10**9))
+
+    def renderFrames():
+        for _ in range(framesPerRun):
+            index = next(frames) % frameCount
+            canvas.restore_region(background)
+            for artist in animate(index):
+                figure.draw_artist(artist)
+            canvas.blit(figure.bbox)
+
+    result = measure(renderFrames, repeats)
+    result["throughput"] = framesPerRun / result["seconds"]
+    result["unit"] = "frames/s"
+    plt.close(figure)
+    yield f"time_comparison_animation/frames{frameCount}", result
+
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def compareToBaseline(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        result["baselineRatio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the physics kernels, integrators and rendering.")
+    parser.add_argument("--suites", nargs="+", default=["kernels", "spacecurve", "redraw", "animation"],
+                        choices=["kernels", "spacecurve", "redraw", "animation"])
+    parser.add_argument("--max-size", type=float, default=1e7, help="largest kernel array (up to 1e8)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save", help="write results to this JSON baseline file")
+    parser.add_argument("--baseline", help="compare against this JSON baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    suites = {
+        "kernels": lambda: kernelBenchmarks(args.max_size, args.repeats),
+        "spacecurve": lambda: spaceCurveBenchmarks(args.repeats),
+        "redraw": lambda: redrawBenchmarks(args.repeats),
+        "animation": lambda: animationBenchmarks(args.repeats),
+    }
+
+    results = {}
+    for suite in args.suites:
+        for name, result in suites[suite]():
+            results[name] = result
+            print(f"{name:55s} {result['seconds'] * 1e3:10.3f} ms  {result['throughput']:12.4g} {result['unit']:12s} "
+                  f"peak {result['peakBytes'] / 1024**2:9.2f} MiB", flush=True)
+
+    exitCode = 0
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            regressions = compareToBaseline(results, json.load(baselineFile), args.tolerance)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x slower than baseline")
+        exitCode = 1 if regressions else 0
+
+    if args.save:
+        with open(args.save, "w") as saveFile:
+            json.dump({"environment": environment(), "results": results}, saveFile, indent=1, sort_keys=True)
+
+    return exitCode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
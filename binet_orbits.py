@@ -0,0 +1,329 @@
+from functools import lru_cache
+
+import numpy as np
+
+from instrumentation import traced, addCount
+
+
+# Writing u = 1/r and using the conserved angular momentum L = r^2 * omega, the
+# equations of motion in helpers.geodesicDerivative reduce to the Binet form
+#
+#     u'' + u = 3 M u^2 - kappa M / (L^2 u)
+#
+# with primes taking d/dphi. For kappa = 0 this is the null geodesic equation,
+# whose first integral u'^2 + u^2 - 2 M u^3 = 1/b^2 fixes the orbit shape by
+# the impact parameter b alone; in units of the Schwarzschild radius that shape
+# is the same for every mass.
+CRITICAL_IMPACT = 3 * np.sqrt(3) / 2
+RADIAL_TOLERANCE = 1e-12
+
+
+def binetAcceleration(u, mass, kappa, angularMomentum):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kappaTerm = np.where(kappa != 0, kappa * mass / (angularMomentum**2 * u), 0)
+    return 3 * mass * u**2 - u - kappaTerm
+
+
+def _stepBinet(u, w, t, h, mass, kappa, angularMomentum):
+    addCount("binet.rhsCalls", 4)
+    addCount("binet.rhsTrajectories", 4 * np.size(u))
+
+    def rates(u, w):
+        return w, binetAcceleration(u, mass, kappa, angularMomentum), 1 / (angularMomentum * u**2)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        k1 = rates(u, w)
+        k2 = rates(u + 0.5*h*k1[0], w + 0.5*h*k1[1])
+        k3 = rates(u + 0.5*h*k2[0], w + 0.5*h*k2[1])
+        k4 = rates(u + h*k3[0], w + h*k3[1])
+    return tuple(value + (h/6)*(a + 2*b + 2*c + d) for value, a, b, c, d in zip((u, w, t), k1, k2, k3, k4))
+
+
+def orbitInvariants(initialConditions):
+    x, y, vX, vY, kappa = np.atleast_2d(initialConditions).T
+    radius = np.hypot(x, y)
+    angularMomentum = x*vY - y*vX
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radialVelocity = (x*vX + y*vY) / radius
+        u = 1 / radius
+        w = -radialVelocity / np.abs(angularMomentum)
+    return u, w, angularMomentum, np.arctan2(y, x), kappa
+
+
+def impactParameter(initialConditions, mass):
+    u, w, _, _, _ = orbitInvariants(initialConditions)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 / np.sqrt(w**2 + u**2 - 2 * mass * u**3)
+
+
+def classifyCapture(initialConditions, mass):
+    # Asymptotic fate of kappa = 0 orbits from the conserved quantities alone:
+    # above the photon-sphere barrier an ingoing orbit falls in; below it the
+    # orbit stays on whichever side of the photon sphere it started.
+    u, w, angularMomentum, _, _ = orbitInvariants(initialConditions)
+    mass = np.asarray(mass, dtype=float)
+    inverseImpactSq = w**2 + u**2 - 2 * mass * u**3
+    barrier = 1 / (27 * mass**2)
+    inside = u > 1 / (3 * mass)
+    ingoing = w > 0
+    return np.where(inverseImpactSq > barrier, ingoing, inside)
+
+
+def _hermiteBasis(s, span):
+    # Cubic Hermite weights for start, start slope, stop and stop slope at
+    # fraction s of an interval of length span.
+    s2 = s * s
+    s3 = s2 * s
+    return 2*s3 - 3*s2 + 1, (s3 - 2*s2 + s) * span, 3*s2 - 2*s3, (s3 - s2) * span
+
+
+def _hermite(basis, start, stop, startSlope, stopSlope):
+    h00, h10, h01, h11 = basis
+    return h00*start + h10*startSlope + h01*stop + h11*stopSlope
+
+
+def _horizonCrossing(u, w, t, phi, uNext, wNext, tNext, h, captureU, mass, kappa, angularMomentum):
+    # Where a phi step crossed u = captureU: Newton on the cubic Hermite u(phi)
+    # through the step (slopes du/dphi = w), starting from the linear guess;
+    # t follows its own Hermite with dt/dphi = 1 / (L u^2).
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.clip((captureU - u) / (uNext - u), 0, 1)
+        for _ in range(3):
+            slope = ((6*s**2 - 6*s)*u + (3*s**2 - 4*s + 1)*h*w + (6*s - 6*s**2)*uNext + (3*s**2 - 2*s)*h*wNext)
+            s = np.clip(s - (_hermite(_hermiteBasis(s, h), u, uNext, w, wNext) - captureU) / slope, 0, 1)
+        s = np.nan_to_num(s, nan=1.0)
+        basis = _hermiteBasis(s, h)
+        tCross = _hermite(basis, t, tNext, 1 / (angularMomentum * u**2), 1 / (angularMomentum * uNext**2))
+    wCross = _hermite(basis, w, wNext, binetAcceleration(u, mass, kappa, angularMomentum),
+                      binetAcceleration(uNext, mass, kappa, angularMomentum))
+    return captureU, wCross, tCross, phi + s * h
+
+
+@traced("integrateBinet")
+def integrateBinet(initialConditions,
+                   mass,
+                   geoSamples=1000,
+                   geoDelta=5,
+                   captureRadius=None,
+                   phiStep=1e-2,
+                   maxSteps=1000000,
+                   cancelled=None
+                   ):
+    from geodesic_integrator import integrateGeodesics
+
+    initialConditions = np.atleast_2d(np.asarray(initialConditions, dtype=float))
+    count = initialConditions.shape[0]
+    mass = np.broadcast_to(np.asarray(mass, dtype=float), (count,))
+    if captureRadius is None:
+        captureRadius = 2 * mass
+    captureRadius = np.broadcast_to(np.asarray(captureRadius, dtype=float), (count,))
+
+    times = np.linspace(0, geoSamples * geoDelta, geoSamples + 1)
+    states = np.empty((count, 4, geoSamples + 1))
+    captured = np.zeros(count, dtype=bool)
+    captureTimes = np.full(count, np.nan)
+
+    u0, w0, angularMomentum, phi0, kappa = orbitInvariants(initialConditions)
+    radial = np.abs(angularMomentum) < RADIAL_TOLERANCE * np.maximum(1, 1 / u0)
+    if radial.any():
+        # Purely radial motion has no angular momentum to trade for phi, so
+        # those rows go through the Cartesian integrator instead.
+        solution = integrateGeodesics(initialConditions[radial], mass[radial], geoSamples, geoDelta,
+                                      captureRadius=captureRadius[radial], method="fixed", cancelled=cancelled)
+        if solution is None:
+            return None
+        _, states[radial], captured[radial], captureTimes[radial] = solution
+
+    rows = np.flatnonzero(~radial)
+    if rows.size == 0:
+        return times, states, captured, captureTimes
+
+    direction = np.sign(angularMomentum[rows])
+    L = np.abs(angularMomentum[rows])
+    tEnd = times[-1]
+
+    # (u, w, phi) at the output times, filled in as each phi step passes them.
+    # The loop works on a compacted set of the still-running rows: index maps
+    # it back to rows, and nextSample is the first output time not reached.
+    samples = np.empty((3, rows.size, geoSamples + 1))
+    samples[:2, :, 0] = u0[rows], w0[rows]
+    samples[2, :, 0] = 0
+    final = np.zeros((3, rows.size))
+    finalSample = np.ones(rows.size, dtype=int)
+
+    index = np.arange(rows.size)
+    u, w = u0[rows], w0[rows]
+    t, phi = np.zeros(rows.size), np.zeros(rows.size)
+    rowL, rowMass, rowKappa, captureU = L, mass[rows], kappa[rows], 1 / captureRadius[rows]
+    nextSample = np.ones(rows.size, dtype=int)
+
+    done = ~((u < captureU) & (u > 0))
+    # Rows that start inside the horizon count as captured at t = 0, as in the
+    # Cartesian integrators.
+    inside = rows[u >= captureU]
+    captured[inside] = True
+    captureTimes[inside] = 0.0
+    steps = 0
+    while True:
+        if done.any():
+            final[:, index[done]] = u[done], w[done], phi[done]
+            finalSample[index[done]] = nextSample[done]
+            keep = ~done
+            index, u, w, t, phi = index[keep], u[keep], w[keep], t[keep], phi[keep]
+            rowL, rowMass, rowKappa, captureU = rowL[keep], rowMass[keep], rowKappa[keep], captureU[keep]
+            nextSample = nextSample[keep]
+        if index.size == 0:
+            break
+        if cancelled is not None and cancelled():
+            return None
+        if steps == maxSteps:
+            raise RuntimeError(f"integrateBinet: {index.size} orbits did not reach t = {tEnd} within maxSteps = {maxSteps}")
+        steps += 1
+
+        # Near-radial orbits sweep little angle, and massive particles far out
+        # feel a strong kappa term, so the phi step also limits the relative
+        # change in u per step from either velocity or acceleration to 1%.
+        with np.errstate(divide='ignore'):
+            acceleration = np.abs(binetAcceleration(u, rowMass, rowKappa, rowL))
+            h = np.minimum(phiStep, np.minimum(0.01 * u / np.abs(w), np.sqrt(0.02 * u / acceleration)))
+        uNext, wNext, tNext = _stepBinet(u, w, t, h, rowMass, rowKappa, rowL)
+        phiNext = phi + h
+
+        # A step that overshoots r -> infinity is dropped and the orbit ends
+        # at its last state; a step across the horizon is cut at the crossing.
+        accepted = (uNext > 0) & np.isfinite(tNext)
+        fell = accepted & (uNext >= captureU)
+        if fell.any():
+            uB, wB, tB, phiB = _horizonCrossing(u[fell], w[fell], t[fell], phi[fell], uNext[fell], wNext[fell],
+                                                tNext[fell], h[fell], captureU[fell], rowMass[fell], rowKappa[fell],
+                                                rowL[fell])
+            uNext[fell], wNext[fell], tNext[fell], phiNext[fell] = uB, wB, tB, phiB
+            hit = rows[index[fell][tB <= tEnd]]
+            captured[hit] = True
+            captureTimes[hit] = tB[tB <= tEnd]
+
+        passed = np.maximum(np.where(accepted, np.searchsorted(times, tNext, side="right"), 0) - nextSample, 0)
+        if passed.any():
+            # Every output time the step passed, interpolated with cubic
+            # Hermites in t (slopes d/dt = L u^2 d/dphi).
+            crossing = np.flatnonzero(passed)
+            counts = passed[crossing]
+            local = np.repeat(crossing, counts)
+            sample = (np.repeat(nextSample[crossing], counts)
+                      + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+            uA, wA, tA, phiA = u[local], w[local], t[local], phi[local]
+            uB, wB, tB, phiB = uNext[local], wNext[local], tNext[local], phiNext[local]
+            stepL, stepMass, stepKappa = rowL[local], rowMass[local], rowKappa[local]
+            rateA, rateB = stepL * uA**2, stepL * uB**2
+            basis = _hermiteBasis((times[sample] - tA) / (tB - tA), tB - tA)
+            samples[0, index[local], sample] = _hermite(basis, uA, uB, wA * rateA, wB * rateB)
+            samples[1, index[local], sample] = _hermite(basis, wA, wB, binetAcceleration(uA, stepMass, stepKappa, stepL) * rateA,
+                                                        binetAcceleration(uB, stepMass, stepKappa, stepL) * rateB)
+            samples[2, index[local], sample] = _hermite(basis, phiA, phiB, rateA, rateB)
+            nextSample += passed
+
+        u = np.where(accepted, uNext, u)
+        w = np.where(accepted, wNext, w)
+        t = np.where(accepted, tNext, t)
+        phi = np.where(accepted, phiNext, phi)
+        done = ~accepted | fell | (t >= tEnd)
+
+    # Rows that stopped early (captured or escaped) hold their last state.
+    held = np.arange(geoSamples + 1)[None, :] >= finalSample[:, None]
+    np.copyto(samples, final[:, :, None], where=held[None])
+
+    uAt, wAt, phiAt = samples
+    phiAt = phi0[rows, None] + direction[:, None] * phiAt
+    cosPhi, sinPhi = np.cos(phiAt), np.sin(phiAt)
+    with np.errstate(divide='ignore'):
+        radius = 1 / uAt
+    # Captured rows end on the horizon; keep them a few ulps outside it so
+    # sqrt(1 - rs/r) stays real after the cos/sin rounding.
+    fell = np.flatnonzero(captured[rows] & (captureTimes[rows] > 0))
+    horizon = captureRadius[rows[fell], None]
+    radius[fell] = np.where(uAt[fell] >= 1 / horizon, horizon * (1 + 4*np.finfo(float).eps), radius[fell])
+    radialVelocity = -L[:, None] * wAt
+    tangentialVelocity = direction[:, None] * L[:, None] * uAt
+    states[rows, 0] = radius * cosPhi
+    states[rows, 1] = radius * sinPhi
+    states[rows, 2] = radialVelocity * cosPhi - tangentialVelocity * sinPhi
+    states[rows, 3] = radialVelocity * sinPhi + tangentialVelocity * cosPhi
+
+    return times, states, captured, captureTimes
+
+
+@lru_cache(maxsize=8)
+@traced("binetOrbitTable")
+def binetOrbitTable(impactCount=512, phiCount=4096, maxImpact=50.0, maxPhi=6 * np.pi):
+    # Null orbits arriving from infinity, in units where the Schwarzschild
+    # radius is 1 (M = 1/2). Impact parameters cluster logarithmically around
+    # the critical value where the deflection diverges.
+    offsets = np.geomspace(1e-6, maxImpact - CRITICAL_IMPACT, impactCount // 2)
+    below = CRITICAL_IMPACT - np.geomspace(1e-6, CRITICAL_IMPACT - 0.05, impactCount - impactCount // 2)
+    impacts = np.sort(np.concatenate((below, CRITICAL_IMPACT + offsets)))
+
+    phi = np.linspace(0, maxPhi, phiCount)
+    h = phi[1] - phi[0]
+    u = np.zeros(impacts.size)
+    w = 1 / impacts
+    orbit = np.full((impacts.size, phiCount), np.nan)
+    orbit[:, 0] = 0
+    periapsisU = np.zeros(impacts.size)
+    deflection = np.full(impacts.size, np.nan)
+    captured = np.zeros(impacts.size, dtype=bool)
+    active = np.ones(impacts.size, dtype=bool)
+
+    for step in range(1, phiCount):
+        # Classic RK4 on (u, w) with M = 1/2.
+        k1u, k1w = w, 1.5*u**2 - u
+        k2u, k2w = w + 0.5*h*k1w, 1.5*(u + 0.5*h*k1u)**2 - (u + 0.5*h*k1u)
+        k3u, k3w = w + 0.5*h*k2w, 1.5*(u + 0.5*h*k2u)**2 - (u + 0.5*h*k2u)
+        k4u, k4w = w + h*k3w, 1.5*(u + h*k3u)**2 - (u + h*k3u)
+        uNext = u + (h/6)*(k1u + 2*k2u + 2*k3u + k4u)
+        wNext = w + (h/6)*(k1w + 2*k2w + 2*k3w + k4w)
+
+        fell = active & (uNext >= 1)
+        escaped = active & (uNext <= 0) & (w < 0)
+        captured |= fell
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = phi[step - 1] + h * u / (u - uNext)
+        deflection = np.where(escaped, crossing - np.pi, deflection)
+
+        u = np.where(active, uNext, u)
+        w = np.where(active, wNext, w)
+        active &= ~(fell | escaped)
+        periapsisU = np.where(active | escaped, np.maximum(periapsisU, np.minimum(u, 1)), periapsisU)
+        orbit[active, step] = u[active]
+        if not active.any():
+            break
+
+    periapsisU = np.where(captured, 1.0, periapsisU)
+    return {
+        "impact": impacts,
+        "phi": phi,
+        "orbit": orbit,
+        "captured": captured,
+        "deflection": deflection,
+        "periapsis": 1 / periapsisU
+    }
+
+
+def lookupOrbit(impact, schwarzRadius, table=None):
+    if table is None:
+        table = binetOrbitTable()
+    scaledImpact = np.asarray(impact, dtype=float) / schwarzRadius
+    captured = scaledImpact < CRITICAL_IMPACT
+    escaping = np.isfinite(table["deflection"])
+    deflection = np.interp(scaledImpact, table["impact"][escaping], table["deflection"][escaping])
+    periapsis = np.interp(scaledImpact, table["impact"][escaping], table["periapsis"][escaping])
+    # Past the table edge the second-order weak-field expansion takes over.
+    weakField = scaledImpact > table["impact"][-1]
+    with np.errstate(divide='ignore'):
+        weakDeflection = 2 / scaledImpact + 15 * np.pi / (16 * scaledImpact**2)
+    deflection = np.where(weakField, weakDeflection, deflection)
+    periapsis = np.where(weakField, scaledImpact - 0.5, periapsis)
+    return {
+        "captured": captured,
+        "deflection": np.where(captured, np.nan, deflection),
+        "periapsis": np.where(captured, schwarzRadius, periapsis * schwarzRadius)
+    }
@@ -0,0 +1,166 @@
+import csv
+import math
+import os
+import re
+from functools import cached_property
+
+import numpy as np
+
+from helpers import solarMassToKg
+
+INDEX_VERSION = 1
+
+
+def sexagesimalToDegrees(value, hours=False):
+    value = value.strip()
+    if not value:
+        return np.nan
+    sign = -1 if value.startswith("-") else 1
+    parts = [float(part) for part in value.lstrip("+-").split(":")]
+    degrees = sum(part / 60**i for i, part in enumerate(parts))
+    return sign * degrees * (15 if hours else 1)
+
+
+def objectSlug(name):
+    return re.sub(r'[^A-Za-z0-9_.+-]+', '_', str(name)).strip('_') or "object"
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+class Catalog:
+    """Streams an AGN mass catalog once to build compact NumPy indexes (row byte
+    offsets, names, RA/Dec in degrees and log M_BH); full rows are only parsed
+    when asked for. The index is cached next to the catalog and rebuilt when
+    the catalog's size or modification time changes.
+
+    massKg is the log M_BH column decoded to kilograms once at load time. Like
+    every other caller of solarMassToKg, it takes the catalog value as-is as a
+    mass in solar masses (not 10**logMass), so massKg[i] is the mass the plots
+    and sweeps use for row i.
+    """
+    def __init__(self, path="mbh.csv", skipRows=2, nameColumn="Object", raColumn="Right Ascension",
+                 decColumn="Declination", massColumn="log M_BH", cacheIndex=True):
+        self.path = path
+        self.skipRows = skipRows
+        self.columns = (nameColumn, raColumn, decColumn, massColumn)
+        self.indexPath = f"{path}.idx.npz"
+
+        stat = os.stat(path)
+        self.signature = np.array([INDEX_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        if not (cacheIndex and self._loadIndex()):
+            self._buildIndex()
+            if cacheIndex:
+                self._saveIndex()
+        self.massKg = solarMassToKg(self.logMass)
+
+    def _buildIndex(self):
+        offsets, names, ra, dec, logMass = [], [], [], [], []
+        with open(self.path, "rb") as catalogFile:
+            for _ in range(self.skipRows):
+                catalogFile.readline()
+            self.header = next(csv.reader([catalogFile.readline().decode()]))
+            nameIndex, raIndex, decIndex, massIndex = (self.header.index(column) for column in self.columns)
+
+            offset = catalogFile.tell()
+            for line in catalogFile:
+                if line.strip():
+                    fields = next(csv.reader([line.decode()]))
+                    offsets.append(offset)
+                    names.append(fields[nameIndex])
+                    ra.append(sexagesimalToDegrees(fields[raIndex], hours=True))
+                    dec.append(sexagesimalToDegrees(fields[decIndex]))
+                    logMass.append(_float(fields[massIndex]))
+                offset += len(line)
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.names = np.array(names, dtype=str)
+        self.ra = np.array(ra, dtype=float)
+        self.dec = np.array(dec, dtype=float)
+        self.logMass = np.array(logMass, dtype=float)
+
+    def _loadIndex(self):
+        try:
+            with np.load(self.indexPath) as index:
+                if not np.array_equal(index["signature"], self.signature):
+                    return False
+                self.header = [str(column) for column in index["header"]]
+                self.offsets = index["offsets"]
+                self.names = index["names"]
+                self.ra = index["ra"]
+                self.dec = index["dec"]
+                self.logMass = index["logMass"]
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def _saveIndex(self):
+        try:
+            with open(self.indexPath, "wb") as indexFile:
+                np.savez(indexFile, signature=self.signature, header=np.array(self.header), offsets=self.offsets,
+                         names=self.names, ra=self.ra, dec=self.dec, logMass=self.logMass)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def pageCount(self, pageSize):
+        return max(1, math.ceil(len(self) / pageSize))
+
+    @cached_property
+    def _massOrder(self):
+        order = np.argsort(self.logMass, kind="stable")
+        return order[~np.isnan(self.logMass[order])]
+
+    def row(self, index):
+        with open(self.path, "rb") as catalogFile:
+            catalogFile.seek(self.offsets[index])
+            fields = next(csv.reader([catalogFile.readline().decode()]))
+        return dict(zip(self.header, fields))
+
+    def rows(self, indices):
+        indices = np.asarray(indices, dtype=int)
+        order = np.argsort(self.offsets[indices])
+        fetched = [None] * len(indices)
+        with open(self.path, "rb") as catalogFile:
+            for position in order:
+                catalogFile.seek(self.offsets[indices[position]])
+                fields = next(csv.reader([catalogFile.readline().decode()]))
+                fetched[position] = dict(zip(self.header, fields))
+        return fetched
+
+    @cached_property
+    def _nameOrder(self):
+        return np.argsort(self.names, kind="stable")
+
+    def indexOf(self, name):
+        sortedNames = self.names[self._nameOrder]
+        position = np.searchsorted(sortedNames, name)
+        if position == len(sortedNames) or sortedNames[position] != name:
+            raise KeyError(name)
+        return int(self._nameOrder[position])
+
+    def byName(self, name):
+        return self.row(self.indexOf(name))
+
+    def page(self, page, pageSize):
+        start = (page - 1) * pageSize
+        return range(start, min(start + pageSize, len(self)))
+
+    def massRange(self, low=-np.inf, high=np.inf):
+        sortedMass = self.logMass[self._massOrder]
+        start = np.searchsorted(sortedMass, low, side="left")
+        stop = np.searchsorted(sortedMass, high, side="right")
+        return np.sort(self._massOrder[start:stop])
+
+    def coneSearch(self, ra, dec, radius):
+        # Great-circle (haversine) distance in degrees from (ra, dec).
+        ra1, dec1, ra2, dec2 = map(np.radians, (ra, dec, self.ra, self.dec))
+        haversine = np.sin((dec2 - dec1) / 2)**2 + np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1) / 2)**2
+        distance = np.degrees(2 * np.arcsin(np.sqrt(np.clip(haversine, 0, 1))))
+        return np.flatnonzero(distance <= radius)
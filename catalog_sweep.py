@@ -0,0 +1,140 @@
+import argparse
+import csv
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from helpers import schwarzchildRadius, schwarzchildDilation, gravitationalRedshift, solarMassToKg, kgToGeometricUnit
+from geodesic_integrator import integrateGeodesics, initialConditionArray
+from catalog import Catalog
+from result_store import ResultStore
+from instrumentation import traced
+
+
+sweepSettings = {
+    "sampleRate": 1000,
+    "maxRadiusFactor": 20,
+    "calculateGeo": False,
+    "fanSize": 64,
+    "fanSpeed": 0.1,
+    "fanRadiusFactor": 3,
+    "geoSamples": 2000,
+    "geoDelta": 2000,
+    "geoMethod": "fixed"
+}
+
+
+def loadCatalog(path="mbh.csv"):
+    catalog = Catalog(path)
+    return list(zip(catalog.names.tolist(), catalog.logMass.tolist()))
+
+
+@traced("sweepObject")
+def sweepObject(name, mass, settings=sweepSettings):
+    massKg = solarMassToKg(mass)
+    sRadius = schwarzchildRadius(massKg)
+    radii = np.linspace(sRadius, settings["maxRadiusFactor"] * sRadius, settings["sampleRate"])
+
+    result = {
+        "name": name,
+        "mass": mass,
+        "schwarzRadius": sRadius,
+        "radii": radii,
+        "dilation": schwarzchildDilation(massKg, radii),
+        "redshift": gravitationalRedshift(massKg, radii),
+    }
+
+    if settings["calculateGeo"]:
+        # A fan of test particles launched tangentially from a ring around the
+        # hole, spread evenly in launch angle.
+        angles = np.linspace(0, 2 * np.pi, settings["fanSize"], endpoint=False)
+        launchRadius = settings["fanRadiusFactor"] * sRadius
+        initialState = initialConditionArray(launchRadius * np.cos(angles),
+                                             launchRadius * np.sin(angles),
+                                             -settings["fanSpeed"] * np.sin(angles),
+                                             settings["fanSpeed"] * np.cos(angles))
+        times, states, captured, captureTimes = integrateGeodesics(initialState,
+                                                                   kgToGeometricUnit(massKg),
+                                                                   settings["geoSamples"],
+                                                                   settings["geoDelta"],
+                                                                   captureRadius=sRadius,
+                                                                   method=settings["geoMethod"])
+        result["geodesicTimes"] = times
+        result["geodesicX"] = states[:, 0]
+        result["geodesicY"] = states[:, 1]
+        result["captured"] = captured
+        result["captureTimes"] = captureTimes
+
+    return result
+
+
+def _sweepTask(task):
+    name, mass, settings = task
+    return sweepObject(name, mass, settings)
+
+
+def storeSweepResult(store, result, settings=sweepSettings):
+    curveParameters = {"kind": "curves", "mass": result["mass"],
+                       "sampleRate": settings["sampleRate"], "maxRadiusFactor": settings["maxRadiusFactor"]}
+    entries = [store.writeColumns(result["name"], curveParameters, {
+        "radii": result["radii"],
+        "dilation": result["dilation"],
+        "redshift": result["redshift"],
+    })]
+    if "captured" in result:
+        geodesicParameters = {"kind": "geodesics", "mass": result["mass"],
+                              **{key: settings[key] for key in ("fanSize", "fanSpeed", "fanRadiusFactor", "geoSamples", "geoDelta", "geoMethod")}}
+        entries.append(store.writeColumns(result["name"], geodesicParameters, {
+            "x": result["geodesicX"],
+            "y": result["geodesicY"],
+            "captured": result["captured"],
+            "captureTimes": result["captureTimes"],
+        }))
+    return entries
+
+
+def runCatalogSweep(catalog, outputDir="sweep_output", workers=None, chunkSize=1, settings=sweepSettings):
+    store = ResultStore(outputDir)
+    summaryPath = os.path.join(outputDir, "summary.csv")
+    tasks = [(name, mass, settings) for name, mass in catalog]
+
+    with open(summaryPath, "w", newline="") as summaryFile, Pool(processes=workers) as pool:
+        summary = csv.writer(summaryFile)
+        summary.writerow(["Object", "log M_BH", "Schwarzchild Radius (m)", "Captured Geodesics", "Entries"])
+        for result in pool.imap_unordered(_sweepTask, tasks, chunksize=chunkSize):
+            entries = storeSweepResult(store, result, settings)
+            capturedCount = int(np.sum(result["captured"])) if "captured" in result else ""
+            summary.writerow([result["name"], result["mass"], result["schwarzRadius"], capturedCount, " ".join(entries)])
+            summaryFile.flush()
+            yield result
+        # Let workers exit on their own (rather than being terminated) so
+        # their exit hooks, such as trace writers, still run.
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute black hole curves for every object in the catalog.")
+    parser.add_argument("--catalog", default="mbh.csv")
+    parser.add_argument("--output", default="sweep_output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=1)
+    parser.add_argument("--samples", type=int, default=sweepSettings["sampleRate"])
+    parser.add_argument("--max-radius-factor", type=float, default=sweepSettings["maxRadiusFactor"])
+    parser.add_argument("--geodesics", action="store_true", help="also integrate a geodesic fan per object")
+    parser.add_argument("--fan-size", type=int, default=sweepSettings["fanSize"])
+    args = parser.parse_args()
+
+    settings = dict(sweepSettings,
+                    sampleRate=args.samples,
+                    maxRadiusFactor=args.max_radius_factor,
+                    calculateGeo=args.geodesics,
+                    fanSize=args.fan_size)
+    catalog = loadCatalog(args.catalog)
+    for index, result in enumerate(runCatalogSweep(catalog, args.output, args.workers, args.chunk_size, settings), 1):
+        print(f"[{index}/{len(catalog)}] {result['name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from helpers import gravitationalRedshift, schwarzchildRadius, solarMassToKg
+from catalog import Catalog, objectSlug
+from result_store import ResultStore
+from instrumentation import traced, timed
+
+
+# Everything here is computed in units of the Schwarzschild radius, where the
+# disk image, its redshift map and the line profile are the same for every
+# mass; only the physical scale of the image changes. A mass whose
+# Schwarzschild radius is 1 m lets the helpers work in those units directly.
+UNIT_MASS_KG = 1 / float(schwarzchildRadius(1))
+ISCO_RADIUS = 3
+
+diskSettings = {
+    "inclination": 30,
+    "imageSize": 1024,
+    "extent": 24,
+    "innerRadius": ISCO_RADIUS,
+    "outerRadius": 20,
+    "emissivityIndex": 3,
+    "psiBins": 1024,
+    "radiusSamples": 4096,
+    "lineWavelength": 656.28e-9,
+    "profileBins": 128
+}
+
+
+def beloborodovImpact(radius, psi):
+    # Beloborodov (2002): 1 - cos(alpha) = (1 - cos(psi)) (1 - rs/r), where
+    # psi is the angle between the emission point and the line of sight and
+    # alpha the local emission angle; b = r sin(alpha) / sqrt(1 - rs/r).
+    lapse = 1 - 1 / radius
+    cosAlpha = 1 - (1 - np.cos(psi)) * lapse
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return radius * np.sqrt(np.clip(1 - cosAlpha**2, 0, None) / lapse)
+
+
+def emissionAngle(chi, inclination):
+    # Angle psi between the line of sight and the disk point seen along image
+    # polar angle chi (measured from the image x axis, y along the projected
+    # disk axis) for the primary image.
+    sinI = np.sin(inclination)
+    return np.arccos(-np.sin(chi) * sinI / np.sqrt(1 - (sinI * np.cos(chi))**2))
+
+
+def diskRedshift(radius, alpha, inclination):
+    # 1 + z of a Keplerian emitter: gravitational redshift, the transverse
+    # Doppler factor gamma with v^2 = M / (r - 2M), and the longitudinal term
+    # 1 + Omega * lambda with the photon's angular momentum lambda = alpha sin(i).
+    mass = 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = 1 / np.sqrt(1 - mass / (radius - 2 * mass))
+        omega = np.sqrt(mass / radius**3)
+    return gravitationalRedshift(UNIT_MASS_KG, radius) * gamma * (1 + omega * alpha * np.sin(inclination))
+
+
+@lru_cache(maxsize=16)
+@traced("transferMap")
+def transferMap(inclination, imageSize=1024, extent=24, innerRadius=ISCO_RADIUS, outerRadius=20,
+                psiBins=1024, radiusSamples=4096):
+    inclination = math.radians(inclination)
+    coordinates = np.linspace(-extent, extent, imageSize)
+    alpha, beta = np.meshgrid(coordinates, coordinates[::-1])
+    impact = np.hypot(alpha, beta)
+    psi = emissionAngle(np.arctan2(beta, alpha), inclination)
+
+    # Impact parameter against radius for each psi bin; b grows with r, so each
+    # row inverts with one interpolation over the pixels that fall in its bin.
+    radii = np.geomspace(1 + 1e-6, 2 * outerRadius, radiusSamples)
+    psiGrid = np.linspace(0, np.pi, psiBins)
+    impactTable = beloborodovImpact(radii[None, :], psiGrid[:, None])
+
+    position = psi / np.pi * (psiBins - 1)
+    low = np.clip(np.floor(position).astype(int), 0, psiBins - 2)
+    fraction = position - low
+    lowRadius = np.empty(impact.shape)
+    highRadius = np.empty(impact.shape)
+    flatLow = low.ravel()
+    order = np.argsort(flatLow, kind="stable")
+    bounds = np.searchsorted(flatLow[order], np.arange(psiBins))
+    flatImpact = impact.ravel()
+    for row in range(psiBins - 1):
+        pixels = order[bounds[row]:bounds[row + 1]]
+        if pixels.size:
+            lowRadius.flat[pixels] = np.interp(flatImpact[pixels], impactTable[row], radii, right=np.inf)
+            highRadius.flat[pixels] = np.interp(flatImpact[pixels], impactTable[row + 1], radii, right=np.inf)
+    radius = (1 - fraction) * lowRadius + fraction * highRadius
+
+    visible = (radius >= innerRadius) & (radius <= outerRadius)
+    redshift = np.where(visible, diskRedshift(np.where(visible, radius, innerRadius), alpha, inclination), np.nan)
+    return {
+        "alpha": alpha,
+        "beta": beta,
+        "radius": np.where(visible, radius, np.nan),
+        "redshift": redshift,
+        "visible": visible,
+        "pixelArea": (coordinates[1] - coordinates[0])**2
+    }
+
+
+def diskTransfer(settings=diskSettings):
+    return transferMap(settings["inclination"], settings["imageSize"], settings["extent"], settings["innerRadius"],
+                       settings["outerRadius"], settings["psiBins"], settings["radiusSamples"])
+
+
+def diskFlux(transfer, emissivityIndex=3):
+    # Observed line flux per pixel: g^3 times an r^-q emissivity, g = 1 / (1 + z).
+    g = 1 / transfer["redshift"]
+    with np.errstate(invalid='ignore'):
+        return np.where(transfer["visible"], g**3 * transfer["radius"]**-emissivityIndex, 0)
+
+
+def restFrameProfile(settings=diskSettings):
+    # Line profile against the disk's own shift lambda_obs / lambda_0 = 1 + z.
+    transfer = diskTransfer(settings)
+    if not transfer["visible"].any():
+        raise ValueError("No disk pixels are visible; check the image size and the disk radii")
+    with timed("restFrameProfile"):
+        flux = diskFlux(transfer, settings["emissivityIndex"]) * transfer["pixelArea"]
+        shifts = transfer["redshift"][transfer["visible"]]
+        counts, edges = np.histogram(shifts, bins=settings["profileBins"], weights=flux[transfer["visible"]])
+        counts = counts / (edges[1:] - edges[:-1])
+    return 0.5 * (edges[1:] + edges[:-1]), counts / counts.max()
+
+
+def lineProfile(cosmologicalRedshift=0.0, settings=diskSettings):
+    shifts, flux = restFrameProfile(settings)
+    return settings["lineWavelength"] * shifts * (1 + cosmologicalRedshift), flux
+
+
+def plotDiskImage(settings=diskSettings, name="Accretion Disk", mass=None, show=True):
+    transfer = diskTransfer(settings)
+    flux = diskFlux(transfer, settings["emissivityIndex"])
+    extent = settings["extent"]
+    unit = "r_s"
+    if mass is not None:
+        extent *= schwarzchildRadius(solarMassToKg(mass))
+        unit = "m"
+
+    figure, (fluxAxis, shiftAxis) = plt.subplots(1, 2, figsize=(12, 5))
+    fluxAxis.imshow(np.where(transfer["visible"], flux, np.nan), cmap="inferno", extent=(-extent, extent, -extent, extent))
+    fluxAxis.set_title(f"{name} Observed Flux (i = {settings['inclination']}°)")
+    image = shiftAxis.imshow(transfer["redshift"], cmap="coolwarm", extent=(-extent, extent, -extent, extent))
+    figure.colorbar(image, ax=shiftAxis, label="Redshift Factor (1+z)")
+    shiftAxis.set_title(f"{name} Redshift Map (i = {settings['inclination']}°)")
+    for axis in (fluxAxis, shiftAxis):
+        axis.set_facecolor("black")
+        axis.set_xlabel(f"Image X ({unit})")
+        axis.set_ylabel(f"Image Y ({unit})")
+    if show:
+        plt.show()
+    return figure
+
+
+def plotLineProfile(name, cosmologicalRedshift=0.0, settings=diskSettings, show=True):
+    wavelengths, flux = lineProfile(cosmologicalRedshift, settings)
+    figure = plt.figure()
+    plt.plot(wavelengths * 1e9, flux, label="Disk Line Profile")
+    plt.axvline(x=settings["lineWavelength"] * (1 + cosmologicalRedshift) * 1e9, color='r', linestyle='--', label='Line Center (Cosmological Redshift Only)')
+    plt.title(f"{name} Line Profile (i = {settings['inclination']}°)")
+    plt.xlabel("Observed Wavelength (nm)")
+    plt.ylabel("Normalized Flux")
+    plt.legend()
+    plt.grid()
+    if show:
+        plt.show()
+    return figure
+
+
+def profileCatalog(catalogPath="mbh.csv", outputDir="disk_output", settings=diskSettings, plots=False):
+    catalog = Catalog(catalogPath)
+    rows = catalog.rows(range(len(catalog)))
+    store = ResultStore(outputDir)
+    shifts, flux = restFrameProfile(settings)
+    parameters = {"kind": "lineProfile", **{key: settings[key] for key in
+                  ("inclination", "innerRadius", "outerRadius", "emissivityIndex", "lineWavelength", "profileBins")}}
+
+    for name, row in zip(catalog.names.tolist(), rows):
+        try:
+            cosmologicalRedshift = float(row["Redshift"])
+        except ValueError:
+            cosmologicalRedshift = 0.0
+        wavelengths = settings["lineWavelength"] * shifts * (1 + cosmologicalRedshift)
+        entry = store.writeColumns(name, dict(parameters, redshift=cosmologicalRedshift),
+                                   {"wavelength": wavelengths, "flux": flux})
+        paths = [entry]
+        if plots:
+            path = os.path.join(outputDir, f"{objectSlug(name)}_line_profile.png")
+            figure = plotLineProfile(name, cosmologicalRedshift, settings, show=False)
+            figure.savefig(path)
+            plt.close(figure)
+            paths.append(path)
+        yield name, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a thin accretion disk and line profiles for every catalog AGN.")
+    parser.add_argument("--catalog", default="mbh.csv")
+    parser.add_argument("--output", default="disk_output")
+    parser.add_argument("--inclination", type=float, default=diskSettings["inclination"], help="degrees from face-on")
+    parser.add_argument("--size", type=int, default=diskSettings["imageSize"], help="image pixels per side")
+    parser.add_argument("--outer-radius", type=float, default=diskSettings["outerRadius"], help="in Schwarzschild radii")
+    parser.add_argument("--emissivity", type=float, default=diskSettings["emissivityIndex"])
+    parser.add_argument("--plots", action="store_true", help="also save a line profile plot per object")
+    args = parser.parse_args()
+
+    plt.switch_backend("Agg")
+    settings = dict(diskSettings, inclination=args.inclination, imageSize=args.size, outerRadius=args.outer_radius,
+                    extent=1.2 * args.outer_radius, emissivityIndex=args.emissivity)
+    os.makedirs(args.output, exist_ok=True)
+    figure = plotDiskImage(settings, show=False)
+    imagePath = os.path.join(args.output, f"disk_i{args.inclination:g}.png")
+    figure.savefig(imagePath)
+    plt.close(figure)
+    print(f"disk image: {imagePath}")
+    for name, paths in profileCatalog(args.catalog, args.output, settings, args.plots):
+        print(f"{name}: {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import numpy as np
+from helpers import geodesicDerivativeBatch
+from instrumentation import traced, addCount
+
+
+# Dormand-Prince 5(4) tableau, the same pair scipy's RK45 uses.
+DP_A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+]
+DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+DP_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+
+
+def initialConditionArray(x0, y0, vX0=0, vY0=0, kappa=0):
+    columns = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (x0, y0, vX0, vY0, kappa)))
+    return np.stack([column.ravel() for column in columns], axis=1)
+
+
+def _stepRK4(state, h, mass, kappa):
+    addCount("geodesic.rhsCalls", 4)
+    addCount("geodesic.rhsTrajectories", 4 * state.shape[1])
+    k1 = geodesicDerivativeBatch(state, mass, kappa)
+    k2 = geodesicDerivativeBatch(state + 0.5*h*k1, mass, kappa)
+    k3 = geodesicDerivativeBatch(state + 0.5*h*k2, mass, kappa)
+    k4 = geodesicDerivativeBatch(state + h*k3, mass, kappa)
+    return state + (h/6)*(k1 + 2*k2 + 2*k3 + k4)
+
+
+def _stepDP45(state, h, mass, kappa):
+    addCount("geodesic.rhsCalls", 7)
+    addCount("geodesic.rhsTrajectories", 7 * state.shape[1])
+    stages = [geodesicDerivativeBatch(state, mass, kappa)]
+    for row in DP_A[1:]:
+        increment = sum(coeff*stage for coeff, stage in zip(row, stages) if coeff != 0)
+        stages.append(geodesicDerivativeBatch(state + h*increment, mass, kappa))
+    newState = state + h*sum(coeff*stage for coeff, stage in zip(DP_B, stages) if coeff != 0)
+    error = h*sum(coeff*stage for coeff, stage in zip(DP_E, stages) if coeff != 0)
+    return newState, error
+
+
+def _horizonCrossing(previous, current, captureRadius):
+    # Linear interpolation of the radius between the last two states, used to
+    # estimate when (and where) each captured trajectory crossed the horizon.
+    rPrev = np.hypot(previous[0], previous[1])
+    rCurr = np.hypot(current[0], current[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip((rPrev - captureRadius) / (rPrev - rCurr), 0, 1)
+    fraction = np.nan_to_num(fraction, nan=1.0)
+    crossing = previous + fraction*(current - previous)
+    # The chord between the two states cuts inside the horizon, so push the
+    # crossing back out radially onto it (a few ulps outside, so sqrt(1 - rs/r)
+    # stays real after rounding).
+    radius = np.hypot(crossing[0], crossing[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(radius > 0, captureRadius / radius * (1 + 4*np.finfo(float).eps), 1)
+    crossing[:2] *= scale
+    return fraction, crossing
+
+
+@traced("integrateGeodesics")
+def integrateGeodesics(initialConditions,
+                       mass,
+                       geoSamples=1000,
+                       geoDelta=5,
+                       captureRadius=None,
+                       method="adaptive",
+                       substeps=1,
+                       rtol=1e-3,
+                       atol=1e-6,
+                       properTime=False,
+                       cancelled=None
+                       ):
+    # properTime=True adds proper time (metres, starting at 0) as a fifth row
+    # of the state, integrated together with the motion.
+    if method == "binet":
+        if properTime:
+            raise ValueError("The binet method does not integrate proper time")
+        from binet_orbits import integrateBinet
+        return integrateBinet(initialConditions, mass, geoSamples, geoDelta,
+                              captureRadius=captureRadius, cancelled=cancelled)
+
+    initialConditions = np.atleast_2d(np.asarray(initialConditions, dtype=float))
+    count = initialConditions.shape[0]
+    mass = np.broadcast_to(np.asarray(mass, dtype=float), (count,))
+    kappa = initialConditions[:, 4]
+    if captureRadius is None:
+        captureRadius = 2 * mass
+    captureRadius = np.broadcast_to(np.asarray(captureRadius, dtype=float), (count,))
+
+    times = np.linspace(0, geoSamples * geoDelta, geoSamples + 1)
+    state = np.zeros((5 if properTime else 4, count))
+    state[:4] = initialConditions[:, :4].T
+    states = np.empty((count, state.shape[0], geoSamples + 1))
+    states[:, :, 0] = state.T
+
+    captured = np.hypot(state[0], state[1]) <= captureRadius
+    captureTimes = np.where(captured, 0.0, np.nan)
+
+    if method == "fixed":
+        h = geoDelta / substeps
+        for sample in range(1, geoSamples + 1):
+            if cancelled is not None and cancelled():
+                return None
+            active = np.flatnonzero(~captured)
+            if active.size == 0:
+                states[:, :, sample:] = states[:, :, sample - 1:sample]
+                break
+            previous = state[:, active]
+            current = previous
+            for _ in range(substeps):
+                current = _stepRK4(current, h, mass[active], kappa[active])
+            state[:, active] = current
+
+            crossed = np.hypot(current[0], current[1]) <= captureRadius[active]
+            if crossed.any():
+                hit = active[crossed]
+                fraction, crossing = _horizonCrossing(previous[:, crossed], current[:, crossed], captureRadius[hit])
+                state[:, hit] = crossing
+                captured[hit] = True
+                captureTimes[hit] = times[sample - 1] + fraction*geoDelta
+            states[:, :, sample] = state.T
+
+    elif method == "adaptive":
+        t = np.zeros(count)
+        h = np.full(count, float(geoDelta))
+        nextSample = np.ones(count, dtype=int)
+        minStep = 1e-10 * geoDelta
+        finished = captured.copy()
+        states[captured] = states[captured][:, :, :1]
+        while not finished.all():
+            if cancelled is not None and cancelled():
+                return None
+            active = np.flatnonzero(~finished)
+            target = times[nextSample[active]]
+            step = np.minimum(h[active], target - t[active])
+
+            previous = state[:, active]
+            current, error = _stepDP45(previous, step, mass[active], kappa[active])
+            scale = atol + rtol*np.maximum(np.abs(previous), np.abs(current))
+            with np.errstate(invalid='ignore'):
+                errorNorm = np.sqrt(np.mean((error/scale)**2, axis=0))
+            errorNorm = np.nan_to_num(errorNorm, nan=np.inf)
+            accepted = (errorNorm <= 1) | (step <= minStep)
+            with np.errstate(divide='ignore'):
+                factor = np.clip(0.9*errorNorm**-0.2, 0.2, 10)
+            h[active] = np.maximum(step*factor, minStep)
+
+            done = active[accepted]
+            current = current[:, accepted]
+            previous = previous[:, accepted]
+            t[done] += step[accepted]
+            state[:, done] = current
+
+            crossed = np.hypot(current[0], current[1]) <= captureRadius[done]
+            if crossed.any():
+                hit = done[crossed]
+                fraction, crossing = _horizonCrossing(previous[:, crossed], current[:, crossed], captureRadius[hit])
+                state[:, hit] = crossing
+                captured[hit] = True
+                captureTimes[hit] = t[hit] - (1 - fraction)*step[accepted][crossed]
+                for index in hit:
+                    states[index, :, nextSample[index]:] = state[:, index, None]
+                finished[hit] = True
+
+            landed = done[~crossed & np.isclose(t[done], times[nextSample[done]], rtol=0, atol=minStep)]
+            t[landed] = times[nextSample[landed]]
+            states[landed, :, nextSample[landed]] = state[:, landed].T
+            nextSample[landed] += 1
+            finished[landed[nextSample[landed] > geoSamples]] = True
+
+    else:
+        raise ValueError(f"Unknown integration method: {method}")
+
+    return times, states, captured, captureTimes
@@ -0,0 +1,66 @@
+import numpy as np
+
+from helpers import schwarzchildRadius, solarMassToKg, kgToGeometricUnit
+from geodesic_integrator import integrateGeodesics
+
+
+SWEEP_PARAMETERS = ("mass", "x0", "y0", "vX0", "vY0", "kappa")
+
+
+def sweepDtype(trajectoryPoints=64):
+    return np.dtype([(parameter, "f8") for parameter in SWEEP_PARAMETERS] + [
+        ("captured", "?"),
+        ("periapsis", "f8"),
+        ("timeToHorizon", "f8"),
+        ("trajectory", "f4", (trajectoryPoints, 2))
+    ])
+
+
+def sweepGrid(**parameters):
+    values = [np.atleast_1d(np.asarray(parameters[name], dtype=float)) for name in SWEEP_PARAMETERS]
+    return [axis.ravel() for axis in np.meshgrid(*values, indexing="ij")]
+
+
+def sweepZip(**parameters):
+    values = np.broadcast_arrays(*(np.asarray(parameters[name], dtype=float) for name in SWEEP_PARAMETERS))
+    return [value.ravel() for value in values]
+
+
+def sweepGeodesics(mass,
+                   x0, y0,
+                   vX0=0, vY0=0,
+                   kappa=0,
+                   grid=True,
+                   geoSamples=2000,
+                   geoDelta=2000,
+                   geoMethod="fixed",
+                   trajectoryPoints=64,
+                   chunkSize=4096
+                   ):
+    combine = sweepGrid if grid else sweepZip
+    columns = combine(mass=mass, x0=x0, y0=y0, vX0=vX0, vY0=vY0, kappa=kappa)
+    count = columns[0].size
+
+    results = np.zeros(count, dtype=sweepDtype(trajectoryPoints))
+    for name, column in zip(SWEEP_PARAMETERS, columns):
+        results[name] = column
+
+    keepSamples = np.linspace(0, geoSamples, trajectoryPoints).round().astype(int)
+    for start in range(0, count, chunkSize):
+        chunk = results[start:start + chunkSize]
+        massKg = solarMassToKg(chunk["mass"])
+        schwarzRadius = schwarzchildRadius(massKg)
+        initialState = np.stack([chunk[name] for name in SWEEP_PARAMETERS[1:]], axis=1)
+
+        _, states, captured, captureTimes = integrateGeodesics(initialState,
+                                                               kgToGeometricUnit(massKg),
+                                                               geoSamples,
+                                                               geoDelta,
+                                                               captureRadius=schwarzRadius,
+                                                               method=geoMethod)
+        chunk["captured"] = captured
+        chunk["timeToHorizon"] = captureTimes
+        chunk["periapsis"] = np.hypot(states[:, 0], states[:, 1]).min(axis=1)
+        chunk["trajectory"] = states[:, :2, keepSamples].transpose(0, 2, 1)
+
+    return results
@@ -0,0 +1,174 @@
+import matplotlib
+matplotlib.use("Agg")
+
+import argparse
+import math
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib.pyplot as plt
+from PIL import Image
+
+from helpers import schwarzchildRadius, solarMassToKg
+from catalog import objectSlug
+from catalog_sweep import loadCatalog
+from time_dilation_plot import plotTimeDilation
+from redshift_plot import plotRedshift
+from spacetime_curve import spacetimeData, plotSpaceCurveSubplots
+from time_animation import build_time_comparison
+
+
+exportSettings = {
+    "formats": ("png", "gif"),
+    "frameCount": 200,
+    "framesPerTask": 25,
+    "fps": 10,
+    "dpi": 100,
+    "viewRadiusFactor": 2.5
+}
+
+
+def objectDirectory(outputDir, name):
+    return os.path.join(outputDir, objectSlug(name))
+
+
+def framePath(framesDir, index):
+    return os.path.join(framesDir, f"frame_{index:05d}.png")
+
+
+def objectSpacetimeData(name, mass, settings=exportSettings):
+    viewRadius = settings["viewRadiusFactor"] * schwarzchildRadius(solarMassToKg(mass))
+    return dict(spacetimeData, name=name, mass=mass, viewRadius=viewRadius, x0=viewRadius, y0=viewRadius)
+
+
+def renderStaticPlots(name, mass, outputDir, settings=exportSettings):
+    directory = objectDirectory(outputDir, name)
+    os.makedirs(directory, exist_ok=True)
+    data = objectSpacetimeData(name, mass, settings)
+    paths = []
+
+    figure = plotTimeDilation(mass, name, maxRadius=data["viewRadius"], show=False, adaptive=True)
+    paths.append(os.path.join(directory, "time_dilation.png"))
+    figure.savefig(paths[-1], dpi=settings["dpi"])
+    plt.close(figure)
+
+    figure = plotRedshift(mass, name, maxRadius=data["viewRadius"], show=False, adaptive=True)
+    paths.append(os.path.join(directory, "redshift.png"))
+    figure.savefig(paths[-1], dpi=settings["dpi"])
+    plt.close(figure)
+
+    figure = plt.figure(figsize=(12, 5))
+    figure.suptitle("Spacetime Curvature Visualization", fontsize=24, fontweight='bold')
+    ax1 = figure.add_subplot(1, 3, 1)
+    ax2 = figure.add_subplot(1, 3, 2)
+    ax3 = figure.add_subplot(1, 3, 3, projection='3d')
+    ax1.set_aspect('equal', 'box')
+    ax2.set_aspect('equal', 'box')
+    figure.subplots_adjust(left=0.05, right=0.95, top=0.85, bottom=0.1, wspace=0.15)
+    plotSpaceCurveSubplots(ax1, ax2, ax3, data)
+    paths.append(os.path.join(directory, "spacetime.png"))
+    figure.savefig(paths[-1], dpi=settings["dpi"])
+    plt.close(figure)
+
+    return paths
+
+
+def renderAnimationFrames(name, mass, start, stop, outputDir, settings=exportSettings):
+    framesDir = os.path.join(objectDirectory(outputDir, name), "time_comparison_frames")
+    os.makedirs(framesDir, exist_ok=True)
+    figure, init, animate = build_time_comparison(mass, settings["frameCount"], animated=False)
+    init()
+    paths = []
+    for index in range(start, stop):
+        animate(index)
+        paths.append(framePath(framesDir, index))
+        figure.savefig(paths[-1], dpi=settings["dpi"])
+    plt.close(figure)
+    return paths
+
+
+def encodeAnimation(name, outputDir, settings=exportSettings):
+    directory = objectDirectory(outputDir, name)
+    framesDir = os.path.join(directory, "time_comparison_frames")
+    frames = [framePath(framesDir, index) for index in range(settings["frameCount"])]
+    paths = []
+
+    if "gif" in settings["formats"]:
+        images = [Image.open(path) for path in frames]
+        paths.append(os.path.join(directory, "time_comparison.gif"))
+        images[0].save(paths[-1], save_all=True, append_images=images[1:],
+                       duration=int(1000 / settings["fps"]), loop=0)
+        for image in images:
+            image.close()
+
+    if "mp4" in settings["formats"]:
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("MP4 export requires ffmpeg on the PATH")
+        paths.append(os.path.join(directory, "time_comparison.mp4"))
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error",
+                        "-framerate", str(settings["fps"]),
+                        "-i", os.path.join(framesDir, "frame_%05d.png"),
+                        "-pix_fmt", "yuv420p",
+                        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                        paths[-1]], check=True)
+
+    if "png" not in settings["formats"]:
+        shutil.rmtree(framesDir)
+
+    return paths
+
+
+def exportCatalog(catalog, outputDir="export_output", workers=None, settings=exportSettings):
+    frameCount = settings["frameCount"]
+    step = settings["framesPerTask"]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        remainingChunks = {}
+        for name, mass in catalog:
+            pending[executor.submit(renderStaticPlots, name, mass, outputDir, settings)] = (name, mass, "static")
+            chunks = range(0, frameCount, step)
+            remainingChunks[name] = len(chunks)
+            for start in chunks:
+                task = executor.submit(renderAnimationFrames, name, mass, start, min(start + step, frameCount), outputDir, settings)
+                pending[task] = (name, mass, "frames")
+
+        while pending:
+            for task in as_completed(list(pending)):
+                name, mass, kind = pending.pop(task)
+                paths = task.result()
+                if kind == "frames":
+                    remainingChunks[name] -= 1
+                    if remainingChunks[name] == 0:
+                        pending[executor.submit(encodeAnimation, name, outputDir, settings)] = (name, mass, "encode")
+                        break
+                    continue
+                yield name, kind, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every visualization for the catalog without a display.")
+    parser.add_argument("--catalog", default="mbh.csv")
+    parser.add_argument("--output", default="export_output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--formats", nargs="+", choices=["png", "gif", "mp4"], default=list(exportSettings["formats"]))
+    parser.add_argument("--frames", type=int, default=exportSettings["frameCount"])
+    parser.add_argument("--fps", type=int, default=exportSettings["fps"])
+    parser.add_argument("--dpi", type=int, default=exportSettings["dpi"])
+    parser.add_argument("--objects", nargs="*", help="only export these catalog objects")
+    args = parser.parse_args()
+
+    if "mp4" in args.formats and shutil.which("ffmpeg") is None:
+        parser.error("MP4 export requires ffmpeg on the PATH")
+
+    settings = dict(exportSettings, formats=tuple(args.formats), frameCount=args.frames, fps=args.fps, dpi=args.dpi)
+    catalog = [(name, mass) for name, mass in loadCatalog(args.catalog)
+               if math.isfinite(mass) and (not args.objects or name in args.objects)]
+    for name, kind, paths in exportCatalog(catalog, args.output, args.workers, settings):
+        print(f"{name} ({kind}): {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
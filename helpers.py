@@ -3,21 +3,29 @@ from constants import GRAV_CONST, LIGHT_SPEED, SOLAR_MASS_KG
 
 
 def schwarzchildRadius(mass):
-    return (2*GRAV_CONST*mass)/(LIGHT_SPEED**2)
+    return (2*GRAV_CONST*np.asarray(mass, dtype=float))/(LIGHT_SPEED**2)
+
+
+def outsideHorizon(mass, radius):
+    return np.asarray(radius, dtype=float) >= schwarzchildRadius(mass)
 
 
 def schwarzchildDilation(mass, radius):
     radLimit = schwarzchildRadius(mass)
-    if radius < radLimit: 
-        return 0 
-    return np.sqrt(1-(radLimit/radius))
+    radius = np.asarray(radius, dtype=float)
+    outside = radius >= radLimit
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dilation = np.where(outside, np.sqrt(1-(radLimit/radius)), 0.0)
+    return dilation[()]
 
 
 def gravitationalRedshift(mass, radius):
     radLimit = schwarzchildRadius(mass)
-    if radius < radLimit: 
-        return 0 
-    return (np.sqrt(1-(radLimit/radius)))**(-1)
+    radius = np.asarray(radius, dtype=float)
+    outside = radius >= radLimit
+    with np.errstate(divide='ignore', invalid='ignore'):
+        redshift = np.where(outside, 1/np.sqrt(1-(radLimit/radius)), 0.0)
+    return redshift[()]
 
 
 def spacetimeWarp(x, y, gX, gY, mass, radius):
@@ -56,14 +64,51 @@ def geodesicDerivative(x, y, vX, vY, mass, kappa=0):
     return dx, dy, avX, avY
 
 
+def lineElementRate(x, y, vX, vY, schwarzRadius):
+    # dtau/dt from the Schwarzschild line element
+    #     dtau^2 = (1 - rs/r) dt^2 - dr^2 / (1 - rs/r) - r^2 dphi^2
+    # with coordinate time (in metres, c = 1) as the parameter. Returns the
+    # rate and whether the motion is timelike; spacelike points (which the
+    # simplified equations of motion can reach close to the horizon) get 0.
+    radius = np.hypot(x, y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lapse = 1 - schwarzRadius / radius
+        radialVelocity = (x*vX + y*vY) / radius
+        tangentialVelocity = (x*vY - y*vX) / radius
+        rateSquared = lapse - radialVelocity**2 / lapse - tangentialVelocity**2
+    timelike = (rateSquared > 0) & (lapse > 0)
+    return np.where(timelike, np.sqrt(np.where(timelike, rateSquared, 0)), 0.0), timelike
+
+
+def geodesicDerivativeBatch(state, mass, kappa=0):
+    x, y, vX, vY = state[:4]
+    radius = coordinateToRadius(x, y)
+    valid = radius >= 1e-10
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angularVelocity = (x*vY - y*vX) / (radius**2)
+        accelCoeff = (mass * kappa) / (radius**2) - (3 * mass * angularVelocity**2) / radius
+    accelCoeff = np.where(valid, accelCoeff, 0)
+    dx = np.where(valid, vX, 0)
+    dy = np.where(valid, vY, 0)
+    avX = x * accelCoeff
+    avY = y * accelCoeff
+
+    if len(state) > 4:
+        # Proper time carried as a fifth component, so the step size control
+        # covers it too.
+        return np.stack((dx, dy, avX, avY, lineElementRate(x, y, vX, vY, 2 * mass)[0]))
+    return np.stack((dx, dy, avX, avY))
+
+
 def kgToGeometricUnit(mass):
     return GRAV_CONST * mass / LIGHT_SPEED**2
     
 
 def properTime(t, mass, radius):
-    T0 = t * schwarzchildDilation(mass, radius)
-    return T0
+    T0 = np.asarray(t, dtype=float) * schwarzchildDilation(mass, radius)
+    return T0[()]
 
 
 def redshiftedWavelength(wavelengthEmit, mass, radius):
-    wavelengthInf = wavelengthEmit * gravitationalRedshift(mass, radius)
\ No newline at end of file
+    wavelengthInf = np.asarray(wavelengthEmit, dtype=float) * gravitationalRedshift(mass, radius)
+    return wavelengthInf[()]
@@ -0,0 +1,214 @@
+import atexit
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from functools import wraps
+from multiprocessing import util
+
+
+# Tracing is off unless BHA_TRACE is set or enableTracing() is called. Set it
+# to 1 for a summary table on exit, or to a file name to also write a Chrome
+# trace (open it in chrome://tracing or Perfetto). Worker processes append
+# their pid to the file name.
+traceSettings = {
+    "enabled": False,
+    "tracePath": None,
+    "maxEvents": 1000000
+}
+
+_events = []
+_timers = {}
+_counters = {}
+_lock = threading.Lock()
+_startTime = time.perf_counter()
+_written = set()
+_registered = []
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        recordSpan(self.name, self.start, end, self.category)
+        return False
+
+
+def enableTracing(tracePath=None):
+    traceSettings["enabled"] = True
+    if tracePath is not None:
+        traceSettings["tracePath"] = tracePath
+    if not _registered:
+        # Pool workers leave through os._exit, which skips atexit, but still
+        # run multiprocessing finalizers registered after they start. Forked
+        # workers also begin with empty timers so their traces only hold their
+        # own work.
+        atexit.register(_writeAtExit)
+        util.register_after_fork(_NULL_TIMER, _registerWorkerExit)
+        os.register_at_fork(after_in_child=_resetAfterFork)
+        _registered.append(True)
+
+
+def _registerWorkerExit(_):
+    util.Finalize(None, _writeAtExit, exitpriority=0)
+
+
+def disableTracing():
+    traceSettings["enabled"] = False
+
+
+def tracingEnabled():
+    return traceSettings["enabled"]
+
+
+def resetTracing():
+    with _lock:
+        _events.clear()
+        _timers.clear()
+        _counters.clear()
+
+
+def _resetAfterFork():
+    global _lock
+    _lock = threading.Lock()
+    _events.clear()
+    _timers.clear()
+    _counters.clear()
+
+
+def timed(name, category="stage"):
+    if not traceSettings["enabled"]:
+        return _NULL_TIMER
+    return _Timer(name, category)
+
+
+def traced(name=None, category="function"):
+    def decorator(function):
+        spanName = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not traceSettings["enabled"]:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recordSpan(spanName, start, time.perf_counter(), category)
+        return wrapper
+    return decorator
+
+
+def addCount(name, amount=1):
+    if traceSettings["enabled"]:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+def recordSpan(name, start, end, category="stage"):
+    duration = end - start
+    with _lock:
+        stats = _timers.get(name)
+        if stats is None:
+            _timers[name] = [1, duration, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = min(stats[2], duration)
+            stats[3] = max(stats[3], duration)
+        if len(_events) < traceSettings["maxEvents"]:
+            _events.append((name, category, start, duration, threading.get_ident()))
+
+
+def timerStats():
+    with _lock:
+        return {name: {"calls": calls, "total": total, "mean": total / calls, "min": low, "max": high}
+                for name, (calls, total, low, high) in _timers.items()}
+
+
+def counterStats():
+    with _lock:
+        return dict(_counters)
+
+
+def summaryTable():
+    timers = sorted(timerStats().items(), key=lambda item: -item[1]["total"])
+    lines = [f"{'timer':45s} {'calls':>8s} {'total ms':>11s} {'mean ms':>10s} {'min ms':>10s} {'max ms':>10s}"]
+    for name, stats in timers:
+        lines.append(f"{name:45s} {stats['calls']:8d} {stats['total'] * 1e3:11.3f} {stats['mean'] * 1e3:10.3f} "
+                     f"{stats['min'] * 1e3:10.3f} {stats['max'] * 1e3:10.3f}")
+    counters = sorted(counterStats().items())
+    if counters:
+        lines.append("")
+        lines.append(f"{'counter':45s} {'value':>14s}")
+        for name, value in counters:
+            lines.append(f"{name:45s} {value:14d}")
+    return "\n".join(lines)
+
+
+def chromeTrace():
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    trace = [{
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": (start - _startTime) * 1e6,
+        "dur": duration * 1e6,
+        "pid": pid,
+        "tid": thread
+    } for name, category, start, duration, thread in events]
+    end = max((start + duration for _, _, start, duration, _ in events), default=_startTime)
+    for name, value in counters.items():
+        trace.append({"name": name, "ph": "C", "ts": (end - _startTime) * 1e6, "pid": pid, "args": {name: value}})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def writeChromeTrace(path):
+    with open(path, "w") as traceFile:
+        json.dump(chromeTrace(), traceFile)
+    return path
+
+
+def _processTracePath(path):
+    if multiprocessing.parent_process() is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{extension}"
+
+
+def _writeAtExit():
+    if not traceSettings["enabled"] or os.getpid() in _written:
+        return
+    _written.add(os.getpid())
+    if traceSettings["tracePath"]:
+        writeChromeTrace(_processTracePath(traceSettings["tracePath"]))
+    if multiprocessing.parent_process() is None and (_timers or _counters):
+        print(summaryTable(), file=sys.stderr)
+
+
+_environment = os.environ.get("BHA_TRACE", "")
+if _environment and _environment != "0":
+    enableTracing(None if _environment.lower() in ("1", "true", "yes") else _environment)
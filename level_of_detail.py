@@ -0,0 +1,49 @@
+import numpy as np
+
+
+previewSettings = {
+    "gridCount": 9,
+    "geoSamples": 250,
+    "pixelTolerance": 1.0
+}
+
+
+def previewParameters(data, settings=previewSettings):
+    preview = dict(data)
+    preview["gridCount"] = min(data["gridCount"], settings["gridCount"])
+    if data["geoSamples"] > settings["geoSamples"]:
+        # Keep the same total integration time with fewer, longer samples.
+        preview["geoSamples"] = settings["geoSamples"]
+        preview["geoDelta"] = data["geoDelta"] * data["geoSamples"] / settings["geoSamples"]
+    preview["preview"] = True
+    return preview
+
+
+def decimatePolyline(x, y, pixelSize, pixelTolerance=previewSettings["pixelTolerance"]):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x.size < 3:
+        return x, y
+    cell = pixelSize * pixelTolerance
+    # Bucket samples by arc length in units of screen pixels and keep the first
+    # sample of each bucket, plus both endpoints and one NaN per gap.
+    segments = np.nan_to_num(np.hypot(np.diff(x), np.diff(y)), nan=0.0)
+    arcCells = np.floor(np.concatenate(([0.0], np.cumsum(segments))) / cell)
+    keep = np.ones(x.size, dtype=bool)
+    keep[1:] = arcCells[1:] != arcCells[:-1]
+    gap = np.isnan(x) | np.isnan(y)
+    keep[1:] |= gap[1:] != gap[:-1]
+    keep[1:] &= ~(gap[1:] & gap[:-1])
+    keep[-1] = True
+    return x[keep], y[keep]
+
+
+def axisPixelSize(axis, extent):
+    widthPixels = max(axis.bbox.width, axis.bbox.height, 1)
+    return 2 * extent / widthPixels
+
+
+def screenDecimate(axis, x, y, extent, pixelTolerance=previewSettings["pixelTolerance"]):
+    if np.ndim(x) == 0:
+        return x, y
+    return decimatePolyline(x, y, axisPixelSize(axis, extent), pixelTolerance)
@@ -1,40 +1,37 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.style as mplstyle
 
 from constants import LIST_SIZE
-from helpers import schwarzchildRadius, solarMassToKg
+from catalog import Catalog
+from helpers import schwarzchildRadius
 from time_dilation_plot import plotTimeDilation
 from redshift_plot import plotRedshift
 from spacetime_curve import spacetimeControls, spacetimeData
+from uncertainty import massErrors, objectUncertainty, uncertaintySettings
 from time_animation import time_comparison_animation
 
 mplstyle.use('fast')
 plt.style.use("seaborn-v0_8-dark-palette")
 
 
-dataFrame = pd.read_csv('mbh.csv', skiprows=2, header=0, sep=',')
+catalog = Catalog('mbh.csv')
+pageCount = catalog.pageCount(LIST_SIZE)
 
 
 def PrintPage(page):
-    firstEntry = (page - 1) * LIST_SIZE
-    lastEntry = page * LIST_SIZE
-    if(page > 5):
-        lastEntry = len(dataFrame['Object'])
-        
     print(f"Page: {page}") 
     print("------------------")
-    for i in range(firstEntry, lastEntry):
-        print(f'{i + 1}: {dataFrame['Object'][i]}')
-        print(f'   Mass: {dataFrame['log M_BH'][i]} \n')
+    for i in catalog.page(page, LIST_SIZE):
+        print(f'{i + 1}: {catalog.names[i]}')
+        print(f'   Mass: {catalog.logMass[i]} \n')
 
 
 awaitPageInput = True
 print('View the list of black holes!\n')
 
 while(awaitPageInput):
-    page = int(input("Choose a page number (?/6):"))
-    if page < 1 or page > 6:
+    page = int(input(f"Choose a page number (?/{pageCount}):"))
+    if page < 1 or page > pageCount:
         awaitPageInput = True
     else:
         PrintPage(page)  
@@ -44,19 +41,27 @@ while(awaitPageInput):
 awaitIDInput = True
 print('Choose a black hole from the list to look at!\n')
 while(awaitIDInput):
-    id = int(input("Choose a black hole ID (?/86):"))
-    if id < 1 or id > 86:
+    id = int(input(f"Choose a black hole ID (?/{len(catalog)}):"))
+    if id < 1 or id > len(catalog):
         awaitIDInput = True
     else:
-        name = dataFrame['Object'][id - 1]
-        mass = float(dataFrame['log M_BH'][id - 1])
+        name = str(catalog.names[id - 1])
+        mass = float(catalog.logMass[id - 1])
         awaitIDInput = False
 print('Black Hole:', name)
 print('Mass', mass)
 
 
-sRadius = schwarzchildRadius(solarMassToKg(mass))
+sRadius = schwarzchildRadius(catalog.massKg[id - 1])
 print(f"Schwarzchild radius: {sRadius}")
+errors = massErrors(catalog.row(id - 1))
+if errors is not None:
+    settings = dict(uncertaintySettings, sampleCount=uncertaintySettings["interactiveSampleCount"])
+    _, massUncertainty = objectUncertainty(mass, *errors, settings)
+    levels = settings["quantiles"]
+    quantiles = massUncertainty["schwarzRadius"]["quantiles"][0]
+    low, high = quantiles[levels.index(0.16)], quantiles[levels.index(0.84)]
+    print(f"Schwarzchild radius 68% interval: {low} - {high}")
 radius = -1
 while radius < sRadius:
     if radius > 0:
@@ -72,10 +77,10 @@ spacetimeData["name"] = name
 spacetimeControls()
 
 
-plotTimeDilation(mass, name, maxRadius=radius)
+plotTimeDilation(mass, name, maxRadius=radius, adaptive=True)
 
 
-plotRedshift(mass, name, maxRadius=radius)
+plotRedshift(mass, name, maxRadius=radius, adaptive=True)
 
 
 anim = time_comparison_animation(mass)
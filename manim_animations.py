@@ -1,122 +1,256 @@
 from manim import *
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
 import numpy as np
 
+from helpers import schwarzchildRadius, solarMassToKg, kgToGeometricUnit
+from geodesic_integrator import integrateGeodesics, initialConditionArray
+from level_of_detail import decimatePolyline
+from catalog import objectSlug
+from catalog_sweep import loadCatalog
+
+
+# Scenes are drawn in units of the Schwarzschild radius; the catalog mass sets
+# where the trajectory starts (the launch point is fixed in metres, like the
+# spacetime plot) and therefore what path the integrator produces.
+manimSettings = {
+    "x0": 50000,
+    "y0": 50000,
+    "vX0": -0.1,
+    "vY0": 0,
+    "geoSamples": 2000,
+    "geoDelta": 2000,
+    "pathPoints": 400,
+    "planeExtent": 4,
+    "gridExtent": 6,
+    "wellResolution": 50,
+    "travelTime": 6,
+    "quality": "low_quality"
+}
+
+
+@lru_cache(maxsize=64)
+def sceneTrajectory(mass):
+    # Integrated path in Schwarzschild radii, with the coordinate speed along
+    # it, resampled to pathPoints for animation. Cached per mass since both
+    # scenes of an object use it.
+    settings = manimSettings
+    massKg = solarMassToKg(mass)
+    sRadius = schwarzchildRadius(massKg)
+    initialState = initialConditionArray(settings["x0"], settings["y0"], settings["vX0"], settings["vY0"])
+    _, states, captured, _ = integrateGeodesics(initialState, kgToGeometricUnit(massKg), settings["geoSamples"],
+                                                settings["geoDelta"], captureRadius=sRadius)
+    keep = np.linspace(0, settings["geoSamples"], settings["pathPoints"]).round().astype(int)
+    x, y, vX, vY = states[0][:, keep]
+    return x / sRadius, y / sRadius, np.hypot(vX, vY), bool(captured[0])
+
+
+def wellHeight(u, v, r_s=1.0):
+    epsilon = 0.1
+    r = np.sqrt(u**2 + v**2 + epsilon)
+    return -(r_s / r) * 2
+
+
+@lru_cache(maxsize=4)
+def gravityWellSurface(gridExtent=6, resolution=50):
+    # The well is the same for every object in Schwarzschild units, so each
+    # process builds it once and scenes add copies.
+    return Surface(
+        lambda u, v: np.array([u, v, wellHeight(u, v)]),
+        u_range=[-gridExtent, gridExtent],
+        v_range=[-gridExtent, gridExtent],
+        resolution=(resolution, resolution),
+        checkerboard_colors=[BLUE_D, BLUE_E],
+        fill_opacity=0.7
+    )
+
+
+@lru_cache(maxsize=4)
+def staticMobjects(kind, extent):
+    if kind == "plane":
+        return VGroup(
+            NumberPlane(
+                x_range=[-extent, extent, 1],
+                y_range=[-extent, extent, 1],
+                background_line_style={"stroke_opacity": 0.4}
+            ),
+            Circle(radius=0.3, color=WHITE).set_stroke(width=2),
+            Dot(point=ORIGIN, color=BLACK).scale(3)
+        )
+    return ThreeDAxes(
+        x_range=[-extent, extent, 1],
+        y_range=[-extent, extent, 1],
+        z_range=[-2, 2, 1],
+        x_length=2 * extent,
+        y_length=2 * extent,
+        z_length=4,
+        tips=False
+    )
+
+
+def speedLabel():
+    # A static MathTex with a DecimalNumber updated in place, instead of
+    # rebuilding the TeX every frame.
+    value = DecimalNumber(0, num_decimal_places=2)
+    label = VGroup(MathTex("v_{obs} = "), value).arrange(RIGHT).to_corner(UR).scale(0.9)
+    return label, value
+
 
 class TwoDWarp(Scene):
+    objectName = "Unknown Mass"
+    mass = 7.2301112487166
+
     def construct(self):
-        blackhole=Dot(point=ORIGIN, color=BLACK).scale(3)
-        glow=Circle(radius=0.3, color=WHITE).set_stroke(width=2)
-        grid=NumberPlane(
-            x_range=[-4, 4, 1],
-            y_range=[-4, 4, 1],
-            background_line_style={"stroke_opacity":0.4}
-        )
+        x, y, speed, captured = sceneTrajectory(self.mass)
+        grid, glow, blackhole = staticMobjects("plane", manimSettings["planeExtent"]).copy()
+        # Fit the plane to the path, keeping the horizon circle in proportion.
+        scale = manimSettings["planeExtent"] / max(np.abs(np.concatenate((x, y))).max(), 1.5)
+        glow.scale_to_fit_width(2 * scale)
+        blackhole.scale_to_fit_width(2 * scale)
+
+        title = Text(self.objectName, font_size=32).to_edge(UP)
+        label, value = speedLabel()
+        self.add(title, label)
         self.play(FadeIn(grid, glow, blackhole))
-        particle=Dot(color=YELLOW).scale(0.5)
-        def spiral_path(t):
-            theta=8*t
-            r=3*np.exp(-1.5*t)
-            x=r*np.cos(theta)
-            y=r*np.sin(theta)
-            return np.array([x, y, 0])
-        path_points=[spiral_path(t) for t in np.linspace(0, 2, 500)]
-        path_line=VMobject(color=YELLOW)
-        path_line.set_points_as_corners(path_points)
+
+        px, py = decimatePolyline(x * scale, y * scale, config.frame_width / config.pixel_width)
+        path_line = VMobject(color=YELLOW)
+        path_line.set_points_as_corners(np.stack((px, py, np.zeros_like(px)), axis=1))
         self.play(Create(path_line), run_time=2, rate_func=linear)
-        self.play(MoveAlongPath(particle, path_line), run_time=4, rate_func=linear)
-        self.play(particle.animate.scale(0.1).move_to(ORIGIN), run_time=0.5)
+
+        particle = Dot(color=YELLOW).scale(0.5)
+        t_tracker = ValueTracker(0)
+        samples = np.linspace(0, 1, x.size)
+        particle.add_updater(lambda mob: mob.move_to([np.interp(t_tracker.get_value(), samples, x) * scale,
+                                                      np.interp(t_tracker.get_value(), samples, y) * scale, 0]))
+        value.add_updater(lambda mob: mob.set_value(np.interp(t_tracker.get_value(), samples, speed)))
+        self.add(particle)
+        self.play(t_tracker.animate.set_value(1), run_time=4, rate_func=linear)
+        particle.clear_updaters()
+        value.clear_updaters()
+        if captured:
+            self.play(particle.animate.scale(0.1).move_to(ORIGIN), run_time=0.5)
         self.wait(1)
-        self.play(FadeOut(grid, blackhole, glow, particle))
+        self.play(FadeOut(grid, blackhole, glow, particle, path_line, title, label))
 
 
 class WarpedSpacetime(ThreeDScene):
+    objectName = "Unknown Mass"
+    mass = 7.2301112487166
+
     def construct(self):
         self.set_camera_orientation(phi=70*DEGREES, theta=-45*DEGREES)
 
-        title = Text("Spacetime Warping Near a Black Hole", font_size=36).to_edge(UP)
+        title = Text(f"Spacetime Warping Near {self.objectName}", font_size=36).to_edge(UP)
         self.add_fixed_in_frame_mobjects(title)
         self.play(Write(title))
         self.wait(1)
         self.play(FadeOut(title))
 
-        axes = ThreeDAxes(
-            x_range=[-6, 6, 1],
-            y_range=[-6, 6, 1],
-            z_range=[-2, 2, 1],
-            x_length=12,
-            y_length=12,
-            z_length=4,
-            tips=False
-        )
+        grid_extent = manimSettings["gridExtent"]
+        axes = staticMobjects("axes", grid_extent).copy()
         self.play(Create(axes))
 
-        r_s = 1.0
-        grid_extent = 6
+        label, value = speedLabel()
+        self.add_fixed_in_frame_mobjects(label)
+        self.add(label)
 
-        def velocity(x):
-            epsilon = 1e-6
-            x = max(x, epsilon)
-            return max(0, 1 - r_s / x)
-
-        def get_velocity_from_radius(r):
-            return min(1.0, 1.5 * (1 - r_s / max(r, r_s + 0.01)))
-
-        blackhole = Sphere(radius=r_s, color=BLACK).move_to(ORIGIN)
-
-        r_tracker = ValueTracker(5)
-        velocity_label = always_redraw(lambda:
-            VGroup(
-                MathTex("v_{obs} = "),
-                DecimalNumber(velocity(r_tracker.get_value()), num_decimal_places=2)
-            ).arrange(RIGHT).to_corner(UR).scale(0.9)
-        )
-        self.add_fixed_in_frame_mobjects(velocity_label)
-        self.add(velocity_label)
-
-        def height_func(u, v):
-            x, y = u, v
-            epsilon = 0.1
-            r = np.sqrt(x**2 + y**2 + epsilon)
-            z = -(r_s / r) * 2
-            return np.array([x, y, z])
-
-        gravity_well = Surface(
-            height_func,
-            u_range=[-grid_extent, grid_extent],
-            v_range=[-grid_extent, grid_extent],
-            resolution=(50, 50),
-            checkerboard_colors=[BLUE_D, BLUE_E],
-            fill_opacity=0.7
-        )
+        gravity_well = gravityWellSurface(grid_extent, manimSettings["wellResolution"]).copy()
         self.play(Create(gravity_well))
 
-        particle_radius = 0.1 * r_s
-        particle = Sphere(radius=particle_radius, color=RED)
-        start_pos = height_func(5, 0)
-        particle.move_to(start_pos)
+        # Follow the path until it leaves the well.
+        x, y, speed, _ = sceneTrajectory(self.mass)
+        outside = np.flatnonzero((np.abs(x) > grid_extent) | (np.abs(y) > grid_extent))
+        end = max(outside[0], 2) if outside.size else x.size
+        x, y, speed = x[:end], y[:end], speed[:end]
+        z = wellHeight(x, y)
+        samples = np.linspace(0, 1, x.size)
+
+        particle = Sphere(radius=0.1, color=RED).move_to([x[0], y[0], z[0]])
         self.add(particle)
 
-        path = ParametricFunction(lambda t: height_func(5 - (5 - 1.1 * r_s) * t, 0), t_range=[0, 1])
         t_tracker = ValueTracker(0)
-        self.add(t_tracker)
-        def update_particle(mob):
-            t = t_tracker.get_value()
-            mob.move_to(path.point_from_proportion(t))
-            r_tracker.set_value(abs(mob.get_center()[0]))
-
-        particle.add_updater(update_particle)
-
-        def update_t_tracker(dt):
-            x = particle.get_center()[0]
-            r = abs(x)
-            speed = get_velocity_from_radius(r)
-            new_value=min(1.0, t_tracker.get_value()+0.05*speed)
-            t_tracker.set_value(new_value)
-        
-        t_tracker.add_updater(lambda m, dt: update_t_tracker(dt))
-        self.wait(6)
-        t_tracker.remove_updater(lambda m, dt: update_t_tracker(dt))
-        particle.remove_updater(update_particle)
+        particle.add_updater(lambda mob: mob.move_to([np.interp(t_tracker.get_value(), samples, values)
+                                                      for values in (x, y, z)]))
+        value.add_updater(lambda mob: mob.set_value(np.interp(t_tracker.get_value(), samples, speed)))
+        self.play(t_tracker.animate.set_value(1), run_time=manimSettings["travelTime"], rate_func=linear)
+        particle.clear_updaters()
+        value.clear_updaters()
         self.wait(2)
 
-        self.play(FadeOut(axes, gravity_well, particle, velocity_label))
\ No newline at end of file
+        self.play(FadeOut(axes, gravity_well, particle, label))
+
+
+SCENES = {"TwoDWarp": TwoDWarp, "WarpedSpacetime": WarpedSpacetime}
+
+
+def sceneForObject(sceneClass, name, mass):
+    return type(f"{sceneClass.__name__}_{objectSlug(name)}", (sceneClass,), {"objectName": name, "mass": mass})
+
+
+def clipConfig(sceneName, name, outputDir, quality):
+    return {"quality": quality, "media_dir": outputDir, "output_file": f"{objectSlug(name)}_{sceneName}",
+            "format": "mp4", "verbosity": "WARNING", "progress_bar": "none"}
+
+
+def clipPath(sceneName, name, outputDir="manim_output", quality=manimSettings["quality"]):
+    # Where manim will write the clip, resolved from the same config the render uses;
+    # scenes built here have no input file, so the module part of the path is empty.
+    with tempconfig(clipConfig(sceneName, name, outputDir, quality)):
+        videoDir = config.get_dir("video_dir", module_name="")
+        return os.path.abspath(os.path.join(videoDir, f"{config.output_file}.{config.format}"))
+
+
+def renderClip(sceneName, name, mass, outputDir="manim_output", quality=manimSettings["quality"]):
+    with tempconfig(clipConfig(sceneName, name, outputDir, quality)):
+        scene = sceneForObject(SCENES[sceneName], name, mass)()
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def renderCatalogClips(catalog, outputDir="manim_output", workers=None, scenes=tuple(SCENES), quality=manimSettings["quality"],
+                       force=False):
+    clips = []
+    for name, mass in catalog:
+        for sceneName in scenes:
+            # Clips already on disk are reported as they are instead of re-rendered.
+            path = clipPath(sceneName, name, outputDir, quality)
+            if not force and os.path.exists(path):
+                yield name, sceneName, path
+            else:
+                clips.append((name, mass, sceneName))
+    if not clips:
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(renderClip, sceneName, name, mass, outputDir, quality): (name, sceneName)
+                   for name, mass, sceneName in clips}
+        for task in as_completed(pending):
+            name, sceneName = pending[task]
+            yield name, sceneName, task.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the Manim scenes for every catalog object.")
+    parser.add_argument("--catalog", default="mbh.csv")
+    parser.add_argument("--output", default="manim_output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--scenes", nargs="+", choices=list(SCENES), default=list(SCENES))
+    parser.add_argument("--quality", default=manimSettings["quality"],
+                        choices=["low_quality", "medium_quality", "high_quality", "production_quality"])
+    parser.add_argument("--objects", nargs="*", help="only render these catalog objects")
+    parser.add_argument("--force", action="store_true", help="re-render clips that already exist")
+    args = parser.parse_args()
+
+    catalog = [(name, mass) for name, mass in loadCatalog(args.catalog)
+               if math.isfinite(mass) and (not args.objects or name in args.objects)]
+    for name, sceneName, path in renderCatalogClips(catalog, args.output, args.workers, args.scenes, args.quality,
+                                                     args.force):
+        print(f"{name} ({sceneName}): {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import numpy as np
+
+from constants import LIGHT_SPEED
+from helpers import schwarzchildRadius, solarMassToKg, kgToGeometricUnit, lineElementRate
+from geodesic_integrator import integrateGeodesics, initialConditionArray
+from instrumentation import traced
+
+
+def properTimeRate(states, schwarzRadius):
+    # dtau/dt and whether the motion is timelike at every sample of a batch of
+    # integrated states.
+    x, y, vX, vY = (states[:, index] for index in range(4))
+    schwarzRadius = np.asarray(schwarzRadius, dtype=float).reshape(-1, *([1] * (x.ndim - 1)))
+    return lineElementRate(x, y, vX, vY, schwarzRadius)
+
+
+@traced("integrateProperTime")
+def integrateProperTime(initialConditions,
+                        mass,
+                        geoSamples=1000,
+                        geoDelta=5,
+                        captureRadius=None,
+                        method="adaptive",
+                        dense=False,
+                        cancelled=None
+                        ):
+    # Same arguments as integrateGeodesics (mass in geometric units, times in
+    # metres of coordinate time). Proper time is integrated with the state, so
+    # the adaptive step control covers it. Returns elapsed coordinate and
+    # proper time in seconds per trajectory; dense=True also keeps per-sample
+    # arrays for properTimeAt.
+    solution = integrateGeodesics(initialConditions, mass, geoSamples, geoDelta,
+                                  captureRadius=captureRadius, method=method, properTime=True, cancelled=cancelled)
+    if solution is None:
+        return None
+    times, states, captured, captureTimes = solution
+    count = states.shape[0]
+    mass = np.broadcast_to(np.asarray(mass, dtype=float), (count,))
+    schwarzRadius = 2 * mass if captureRadius is None else np.broadcast_to(np.asarray(captureRadius, dtype=float), (count,))
+
+    rate, timelike = properTimeRate(states, schwarzRadius)
+    # Captured clocks stop at the horizon.
+    stopped = times[None, :] >= np.where(captured, captureTimes, np.inf)[:, None]
+    rate = np.where(stopped, 0.0, rate)
+    timelike |= stopped
+
+    properTime = states[:, 4] / LIGHT_SPEED
+    coordinateTime = np.minimum(times[None, :], np.where(captured, captureTimes, np.inf)[:, None]) / LIGHT_SPEED
+
+    result = {
+        "coordinateTime": coordinateTime[:, -1],
+        "properTime": properTime[:, -1],
+        "captured": captured,
+        "captureTimes": captureTimes / LIGHT_SPEED,
+        "timelike": timelike.all(axis=1)
+    }
+    if dense:
+        result.update({
+            "times": times / LIGHT_SPEED,
+            "properTimeSamples": properTime,
+            "rateSamples": rate,
+            "radius": np.hypot(states[:, 0], states[:, 1]),
+            "states": states[:, :4]
+        })
+    return result
+
+
+def properTimeAt(solution, t):
+    # Cubic Hermite interpolation of proper time at coordinate times t
+    # (seconds) for every trajectory of a dense solution.
+    times = solution["times"]
+    tau = solution["properTimeSamples"]
+    rate = solution["rateSamples"]
+    t = np.clip(np.asarray(t, dtype=float), times[0], times[-1])
+    index = np.clip(np.searchsorted(times, t, side="right") - 1, 0, times.size - 2)
+    h = times[index + 1] - times[index]
+    s = (t - times[index]) / h
+    h00 = 2*s**3 - 3*s**2 + 1
+    h10 = s**3 - 2*s**2 + s
+    h01 = -2*s**3 + 3*s**2
+    h11 = s**3 - s**2
+    return h00*tau[:, index] + h10*h*rate[:, index] + h01*tau[:, index + 1] + h11*h*rate[:, index + 1]
+
+
+def staticClock(radius, angle=0.0):
+    return (radius * np.cos(angle), radius * np.sin(angle), 0.0, 0.0, 0.0)
+
+
+def compareClocks(mass, clocks, duration, samples=1000, reference=None, method="adaptive"):
+    # Runs every clock (name -> (x0, y0, vX0, vY0, kappa), metres and
+    # fractions of c) for the same coordinate duration in seconds around a
+    # catalog mass, in one batch. Offsets are relative to the reference clock,
+    # or to a distant static observer (coordinate time) if none is given.
+    names = list(clocks)
+    massKg = solarMassToKg(mass)
+    initialState = initialConditionArray(*np.array([clocks[name] for name in names], dtype=float).T)
+    solution = integrateProperTime(initialState, kgToGeometricUnit(massKg), samples, duration * LIGHT_SPEED / samples,
+                                   captureRadius=schwarzchildRadius(massKg), method=method)
+    properTime = dict(zip(names, solution["properTime"]))
+    referenceTime = properTime[reference] if reference is not None else duration
+    return {name: {
+        "properTime": properTime[name],
+        "offset": properTime[name] - referenceTime,
+        "ratio": properTime[name] / referenceTime,
+        "captured": bool(solution["captured"][index]),
+        "timelike": bool(solution["timelike"][index])
+    } for index, name in enumerate(names)}
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from helpers import schwarzchildRadius, schwarzchildDilation, gravitationalRedshift, solarMassToKg
+from catalog import Catalog
+from catalog_sweep import sweepObject, sweepSettings
+from geodesic_sweep import sweepGeodesics, SWEEP_PARAMETERS
+from binet_orbits import binetOrbitTable, lookupOrbit
+from instrumentation import addCount
+
+
+# Masses follow the rest of the project: the catalog's log M value (or a
+# "mass" given the same way) goes straight to solarMassToKg. Distances are in
+# metres, velocities in fractions of c and geodesic times in metres of ct.
+serviceSettings = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "catalog": "mbh.csv",
+    "cacheEntries": 1024,
+    "maxBodyBytes": 1 << 20,
+    "batchWindow": 0.005,
+    "pageSize": 20,
+    "geoSamples": 2000,
+    "geoDelta": 2000,
+    "geoMethod": "fixed",
+    "trajectoryPoints": 64
+}
+
+GEODESIC_OPTIONS = ("geoSamples", "geoDelta", "geoMethod", "trajectoryPoints")
+
+
+def toJson(value):
+    # Arrays become nested lists, with NaN and infinities as null so strict
+    # JSON parsers accept the response.
+    if isinstance(value, dict):
+        return {str(key): toJson(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [toJson(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "f":
+            value = np.where(np.isfinite(value), value, None).astype(object)
+        return value.tolist()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _queryValue(key, value):
+    # Query string values: numbers, JSON literals and comma separated lists;
+    # names stay strings.
+    if key == "name":
+        return value
+    if "," in value:
+        return [_queryValue(key, item) for item in value.split(",")]
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _geodesicTask(columns, options):
+    results = sweepGeodesics(*columns, grid=False, **options)
+    return {name: results[name] for name in results.dtype.names}
+
+
+def _sweepTask(name, mass, settings):
+    return sweepObject(name, mass, settings)
+
+
+class GeodesicBatcher:
+    # Geodesic queries that arrive within batchWindow of each other and share
+    # integration options are integrated together as one vectorized sweep in
+    # the pool, then split back into per-query results.
+    def __init__(self, executor, window):
+        self.executor = executor
+        self.window = window
+        self.pending = {}
+
+    async def submit(self, columns, options):
+        loop = asyncio.get_running_loop()
+        group = tuple(sorted(options.items()))
+        if group not in self.pending:
+            self.pending[group] = []
+            loop.call_later(self.window, lambda: asyncio.ensure_future(self._run(group)))
+        future = loop.create_future()
+        self.pending[group].append((columns, future))
+        return await future
+
+    async def _run(self, group):
+        queries = self.pending.pop(group)
+        addCount("service.geodesicBatch", len(queries))
+        columns = [np.concatenate(parts) for parts in zip(*(query for query, _ in queries))]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, _geodesicTask, columns, dict(group))
+        except Exception as error:
+            for _, future in queries:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        start = 0
+        for query, future in queries:
+            stop = start + query[0].size
+            if not future.done():
+                future.set_result({name: values[start:stop] for name, values in results.items()})
+            start = stop
+
+
+class QueryService:
+    # Results are kept in an LRU keyed on the endpoint and its parameters, and
+    # identical queries already being computed share the same task, so repeat
+    # and concurrent questions are answered once. The catalog and the Binet
+    # orbit tables are loaded once at startup.
+    def __init__(self, executor, settings=serviceSettings):
+        self.executor = executor
+        self.settings = settings
+        self.catalog = Catalog(settings["catalog"])
+        self.orbitTable = binetOrbitTable()
+        self.batcher = GeodesicBatcher(executor, settings["batchWindow"])
+        self.cache = OrderedDict()
+        self.inFlight = {}
+        self.hits = 0
+        self.misses = 0
+        self.endpoints = {
+            "radius": self.radius,
+            "dilation": self.dilation,
+            "redshift": self.redshift,
+            "lensing": self.lensing,
+            "geodesic": self.geodesic,
+            "sweep": self.sweep,
+            "catalog": self.catalogQuery
+        }
+
+    def mass(self, params):
+        if "name" in params:
+            return float(self.catalog.logMass[self.catalog.indexOf(params["name"])])
+        return np.asarray(params["mass"], dtype=float)
+
+    def radii(self, params, schwarzRadius):
+        if "radiusFactor" in params:
+            return np.asarray(params["radiusFactor"], dtype=float) * schwarzRadius
+        return np.asarray(params["radius"], dtype=float)
+
+    async def radius(self, params):
+        mass = self.mass(params)
+        return {"mass": mass, "schwarzRadius": schwarzchildRadius(solarMassToKg(mass))}
+
+    async def dilation(self, params):
+        massKg = solarMassToKg(self.mass(params))
+        radii = self.radii(params, schwarzchildRadius(massKg))
+        return {"radius": radii, "dilation": schwarzchildDilation(massKg, radii)}
+
+    async def redshift(self, params):
+        massKg = solarMassToKg(self.mass(params))
+        radii = self.radii(params, schwarzchildRadius(massKg))
+        return {"radius": radii, "redshift": gravitationalRedshift(massKg, radii)}
+
+    async def lensing(self, params):
+        # Photons from infinity, looked up in the precomputed Binet tables.
+        schwarzRadius = schwarzchildRadius(solarMassToKg(self.mass(params)))
+        impact = np.asarray(params["impact"], dtype=float)
+        return {"impact": impact, **lookupOrbit(impact, schwarzRadius, self.orbitTable)}
+
+    async def geodesic(self, params):
+        values = [self.mass(params)] + [params.get(name, 0) for name in SWEEP_PARAMETERS[1:]]
+        columns = [np.ravel(value) for value in np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in values))]
+        options = {name: params.get(name, self.settings[name]) for name in GEODESIC_OPTIONS}
+        return await self.batcher.submit(columns, options)
+
+    async def sweep(self, params):
+        mass = float(self.mass(params))
+        settings = dict(sweepSettings, **{key: params[key] for key in sweepSettings if key in params})
+        name = params.get("name", f"mass {mass:g}")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _sweepTask, name, mass, settings)
+
+    async def catalogQuery(self, params):
+        catalog = self.catalog
+        if "name" in params:
+            index = catalog.indexOf(params["name"])
+            return {"index": index, "name": params["name"], "mass": catalog.logMass[index], "massKg": catalog.massKg[index],
+                    "row": catalog.row(index)}
+        if "ra" in params:
+            indices = catalog.coneSearch(params["ra"], params["dec"], params.get("radius", 1.0))
+        elif "low" in params or "high" in params:
+            indices = catalog.massRange(params.get("low", -np.inf), params.get("high", np.inf))
+        elif "page" in params:
+            indices = np.asarray(catalog.page(int(params["page"]), int(params.get("pageSize", self.settings["pageSize"]))))
+        else:
+            return {"count": len(catalog), "pageCount": catalog.pageCount(self.settings["pageSize"])}
+        return {"index": indices, "name": catalog.names[indices], "mass": catalog.logMass[indices],
+                "massKg": catalog.massKg[indices]}
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.cache), "inFlight": len(self.inFlight)}
+
+    async def query(self, endpoint, params):
+        key = (endpoint, json.dumps(params, sort_keys=True))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            addCount("service.cache.hit")
+            return self.cache[key]
+        if key not in self.inFlight:
+            self.misses += 1
+            addCount("service.cache.miss")
+            self.inFlight[key] = asyncio.ensure_future(self._compute(key, endpoint, params))
+        return await asyncio.shield(self.inFlight[key])
+
+    async def _compute(self, key, endpoint, params):
+        try:
+            result = toJson(await self.endpoints[endpoint](params))
+        finally:
+            del self.inFlight[key]
+        self.cache[key] = result
+        while len(self.cache) > self.settings["cacheEntries"]:
+            self.cache.popitem(last=False)
+        return result
+
+    async def batch(self, endpoint, items):
+        # A list body is answered item by item in the same order; failures are
+        # reported per item. On /batch every item names its own endpoint.
+        queries = []
+        for item in items:
+            params = dict(item)
+            queries.append(self.query(params.pop("endpoint") if endpoint == "batch" else endpoint, params))
+        results = await asyncio.gather(*queries, return_exceptions=True)
+        return [{"error": repr(result)} if isinstance(result, Exception) else result for result in results]
+
+    async def respond(self, target, body):
+        url = urlsplit(target)
+        endpoint = url.path.strip("/")
+        params = {key: _queryValue(key, value) for key, value in parse_qsl(url.query)}
+        if endpoint == "stats":
+            return 200, self.stats()
+        if endpoint not in self.endpoints and endpoint != "batch":
+            return 404, {"error": f"unknown endpoint {url.path}", "endpoints": list(self.endpoints) + ["batch", "stats"]}
+        try:
+            payload = json.loads(body) if body else {}
+            if isinstance(payload, list):
+                return 200, await self.batch(endpoint, [dict(params, **item) for item in payload])
+            if endpoint == "batch":
+                return 400, {"error": "/batch expects a list of queries"}
+            return 200, await self.query(endpoint, dict(params, **payload))
+        except (LookupError, ValueError, TypeError) as error:
+            return 400, {"error": repr(error)}
+        except Exception as error:
+            return 500, {"error": repr(error)}
+
+    async def handleConnection(self, reader, writer):
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine.strip():
+                    break
+                method, target, version = requestLine.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.settings["maxBodyBytes"]:
+                    status, payload = 413, {"error": "request body too large"}
+                    headers["connection"] = "close"
+                elif method not in ("GET", "POST"):
+                    status, payload = 405, {"error": f"method {method} not allowed"}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.respond(target, body)
+
+                keepAlive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode()
+                writer.write(f"{version} {status} {'OK' if status == 200 else 'Error'}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(settings=serviceSettings, workers=None):
+    # Workers come from a forkserver so they never inherit the listening
+    # socket or open client connections, which would keep "Connection: close"
+    # responses from reaching EOF.
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver")) as executor:
+        service = QueryService(executor, settings)
+        await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(executor, os.getpid) for _ in range(workers)))
+        server = await asyncio.start_server(service.handleConnection, settings["host"], settings["port"])
+        print(f"Serving on http://{settings['host']}:{settings['port']}/ ({', '.join(service.endpoints)}, batch, stats)")
+        async with server:
+            await server.serve_forever()
+
+
+def serviceQuery(endpoint, payload=None, url=f"http://{serviceSettings['host']}:{serviceSettings['port']}"):
+    # Small client for scripts and notebooks: a dict is one query, a list is
+    # a batch.
+    data = None if payload is None else json.dumps(toJson(payload)).encode()
+    request = urllib.request.Request(f"{url}/{endpoint}", data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve radius, dilation, redshift, geodesic and sweep queries as JSON over HTTP.")
+    parser.add_argument("--host", default=serviceSettings["host"])
+    parser.add_argument("--port", type=int, default=serviceSettings["port"])
+    parser.add_argument("--catalog", default=serviceSettings["catalog"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-entries", type=int, default=serviceSettings["cacheEntries"])
+    parser.add_argument("--batch-window", type=float, default=serviceSettings["batchWindow"],
+                        help="seconds to wait for geodesic queries to batch together")
+    args = parser.parse_args()
+
+    settings = dict(serviceSettings, host=args.host, port=args.port, catalog=args.catalog,
+                    cacheEntries=args.cache_entries, batchWindow=args.batch_window)
+    try:
+        asyncio.run(serve(settings, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from helpers import schwarzchildRadius, solarMassToKg
+from binet_orbits import CRITICAL_IMPACT, binetOrbitTable, lookupOrbit
+from catalog import objectSlug
+from catalog_sweep import loadCatalog
+from instrumentation import traced
+
+
+# Rays are traced backwards from a pinhole camera on the +z axis looking at
+# the hole. Every pixel becomes one null geodesic whose impact parameter fixes
+# its total bending through the precomputed Binet tables, so whole tiles are
+# traced with a handful of array operations and no per-pixel integration.
+rayTraceSettings = {
+    "width": 1280,
+    "height": 720,
+    "fov": 60,
+    "cameraDistance": 1000000,
+    "background": "checker",
+    "checkerCount": 24,
+    "ringWidth": 0.05,
+    "ringGain": 1.5,
+    "tileRows": 90
+}
+
+
+def checkerBackground(longitude, latitude, checkerCount=24):
+    cellLon = np.floor(longitude / (2 * np.pi) * checkerCount).astype(int)
+    cellLat = np.floor(latitude / np.pi * checkerCount / 2).astype(int)
+    light = (cellLon + cellLat) % 2 == 0
+    # Tint by hemisphere so the lensed images of either side stay distinguishable.
+    upper = latitude >= 0
+    colors = np.empty(longitude.shape + (3,))
+    colors[...] = np.where(light[..., None],
+                           np.where(upper[..., None], [0.95, 0.85, 0.55], [0.55, 0.75, 0.95]),
+                           np.where(upper[..., None], [0.35, 0.2, 0.1], [0.1, 0.2, 0.35]))
+    return colors
+
+
+@lru_cache(maxsize=2)
+def loadBackground(path):
+    return np.asarray(Image.open(path).convert("RGB"), dtype=np.float32) / 255
+
+
+def sampleEquirectangular(image, longitude, latitude):
+    height, width = image.shape[:2]
+    column = ((longitude / (2 * np.pi) + 0.5) * width).astype(int) % width
+    row = np.clip(((0.5 - latitude / np.pi) * height).astype(int), 0, height - 1)
+    return image[row, column]
+
+
+def cameraRays(rows, width, height, fov):
+    # Pixel directions relative to the line of sight: the angle theta away from
+    # the hole and the unit offset (ex, ey) in the image plane.
+    focal = (width / 2) / math.tan(math.radians(fov) / 2)
+    x = np.arange(width) - (width - 1) / 2
+    y = (height - 1) / 2 - np.asarray(rows, dtype=float)
+    X, Y = np.meshgrid(x, y)
+    offset = np.hypot(X, Y)
+    theta = np.arctan2(offset, focal)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ex = np.where(offset > 0, X / offset, 1)
+        ey = np.where(offset > 0, Y / offset, 0)
+    return theta, ex, ey
+
+
+@traced("traceTile")
+def traceTile(mass, rowStart, rowStop, settings=rayTraceSettings, background=None):
+    schwarzRadius = schwarzchildRadius(solarMassToKg(mass))
+    cameraRadius = settings["cameraDistance"] / schwarzRadius
+    if cameraRadius <= 1.5:
+        raise ValueError(f"Camera at {cameraRadius:.3g} rs must sit outside the photon sphere (1.5 rs)")
+
+    theta, ex, ey = cameraRays(np.arange(rowStart, rowStop), settings["width"], settings["height"], settings["fov"])
+    # Impact parameter (in Schwarzschild radii) of a ray leaving a static
+    # camera at angle theta from the radial direction.
+    impact = cameraRadius * np.sin(theta) / np.sqrt(1 - 1 / cameraRadius)
+    orbit = lookupOrbit(impact, 1.0, binetOrbitTable())
+
+    # The tables bend rays from infinity to infinity; the camera sits at a
+    # finite distance, so remove the weak-field bending of the missing leg.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        missingLeg = np.where(impact > 0, (1 - np.cos(theta)) / impact, 0)
+    # Captured rays have no outgoing direction; they are blacked out below.
+    outgoing = theta - (np.nan_to_num(orbit["deflection"]) - missingLeg)
+
+    directionX = np.sin(outgoing) * ex
+    directionY = np.sin(outgoing) * ey
+    directionZ = -np.cos(outgoing)
+    longitude = np.arctan2(directionX, -directionZ)
+    latitude = np.arcsin(np.clip(directionY, -1, 1))
+
+    if background is None:
+        colors = checkerBackground(longitude, latitude, settings["checkerCount"])
+    else:
+        colors = sampleEquirectangular(background, longitude, latitude)
+
+    # Rays skimming the photon sphere wind around it and pile up into a thin
+    # bright ring just outside the shadow.
+    ring = settings["ringGain"] * np.exp(-((impact - CRITICAL_IMPACT) / settings["ringWidth"])**2)
+    colors = np.clip(colors * (1 + ring[..., None]) + ring[..., None] * 0.5, 0, 1)
+    colors[orbit["captured"]] = 0
+    return rowStart, (colors * 255).astype(np.uint8)
+
+
+def _traceTileTask(task):
+    mass, rowStart, rowStop, settings = task
+    background = None if settings["background"] == "checker" else loadBackground(settings["background"])
+    return traceTile(mass, rowStart, rowStop, settings, background)
+
+
+def tileTasks(mass, settings=rayTraceSettings):
+    rows = settings["tileRows"]
+    return [(mass, start, min(start + rows, settings["height"]), settings)
+            for start in range(0, settings["height"], rows)]
+
+
+def renderBlackHole(mass, settings=rayTraceSettings, executor=None):
+    image = np.empty((settings["height"], settings["width"], 3), dtype=np.uint8)
+    tiles = map(_traceTileTask, tileTasks(mass, settings)) if executor is None \
+        else executor.map(_traceTileTask, tileTasks(mass, settings))
+    for rowStart, tile in tiles:
+        image[rowStart:rowStart + tile.shape[0]] = tile
+    return image
+
+
+def renderCatalog(catalog, outputDir="raytrace_output", workers=None, settings=rayTraceSettings):
+    os.makedirs(outputDir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for name, mass in catalog:
+            path = os.path.join(outputDir, f"{objectSlug(name)}.png")
+            Image.fromarray(renderBlackHole(mass, settings, executor)).save(path)
+            yield name, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ray trace the view of every catalog black hole.")
+    parser.add_argument("--catalog", default="mbh.csv")
+    parser.add_argument("--output", default="raytrace_output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--width", type=int, default=rayTraceSettings["width"])
+    parser.add_argument("--height", type=int, default=rayTraceSettings["height"])
+    parser.add_argument("--fov", type=float, default=rayTraceSettings["fov"], help="horizontal field of view (degrees)")
+    parser.add_argument("--camera-distance", type=float, default=rayTraceSettings["cameraDistance"], help="camera distance from the hole (m)")
+    parser.add_argument("--background", default=rayTraceSettings["background"], help="'checker' or an equirectangular image")
+    parser.add_argument("--objects", nargs="*", help="only render these catalog objects")
+    args = parser.parse_args()
+
+    settings = dict(rayTraceSettings, width=args.width, height=args.height, fov=args.fov,
+                    cameraDistance=args.camera_distance, background=args.background)
+    catalog = [(name, mass) for name, mass in loadCatalog(args.catalog)
+               if math.isfinite(mass) and (not args.objects or name in args.objects)]
+    for name, path in renderCatalog(catalog, args.output, args.workers, settings):
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
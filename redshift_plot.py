@@ -1,14 +1,20 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from helpers import gravitationalRedshift, schwarzchildRadius, solarMassToKg
+from instrumentation import traced
+from adaptive_sampling import adaptiveRadii, adaptiveSettings
 
 
-def plotRedshift(mass=7.2301112487166, name="Unknown Mass", minRadius=0, maxRadius=100000, sampleRate=100):
+@traced("plotRedshift")
+def plotRedshift(mass=7.2301112487166, name="Unknown Mass", minRadius=0, maxRadius=100000, sampleRate=100, show=True, adaptive=False):
     massKg = solarMassToKg(mass)
-    radii = np.linspace(minRadius, maxRadius, sampleRate)
-    redshiftFactors = []
-    for radius in radii:
-        redshiftFactors.append(gravitationalRedshift(massKg, radius))
+    if adaptive:
+        # sampleRate seeds the log-spaced grid; refinement adds points near the horizon.
+        radii, redshiftFactors = adaptiveRadii(lambda radii: gravitationalRedshift(massKg, radii), schwarzchildRadius(massKg),
+                                               minRadius, maxRadius, dict(adaptiveSettings, initialSamples=sampleRate))
+    else:
+        radii = np.linspace(minRadius, maxRadius, sampleRate)
+        redshiftFactors = gravitationalRedshift(massKg, radii)
         
     figure = plt.figure()
     plt.plot(radii, redshiftFactors, label="Redshift Factor")
@@ -18,4 +24,6 @@ def plotRedshift(mass=7.2301112487166, name="Unknown Mass", minRadius=0, maxRadi
     plt.ylabel("Redshift Factor (dλ∞/dλe)")
     plt.legend()
     plt.grid()
-    plt.show()
\ No newline at end of file
+    if show:
+        plt.show()
+    return figure
\ No newline at end of file
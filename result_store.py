@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from catalog import objectSlug
+
+
+INDEX_NAME = "index.json"
+
+
+def parameterKey(parameters):
+    encoded = json.dumps(parameters, sort_keys=True, default=float)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+class ResultStore:
+    # One directory of .npy columns per (catalog object, parameter set), plus
+    # an index.json describing every column set so readers can find and
+    # memory-map them without loading anything.
+    def __init__(self, root="result_store"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.indexPath = os.path.join(root, INDEX_NAME)
+        self.index = self._readIndex()
+
+    def _readIndex(self):
+        if not os.path.exists(self.indexPath):
+            return {}
+        with open(self.indexPath) as indexFile:
+            return json.load(indexFile)
+
+    def _writeIndex(self):
+        handle, tempPath = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(handle, "w") as indexFile:
+            json.dump(self.index, indexFile, indent=1, sort_keys=True)
+        os.replace(tempPath, self.indexPath)
+
+    def entryName(self, objectName, parameters):
+        return f"{objectSlug(objectName)}/{parameterKey(parameters)}"
+
+    def createColumns(self, objectName, parameters, schema, rows):
+        # schema maps column name -> (dtype, per-row shape). Returns writable
+        # memmaps so producers can fill large sweeps chunk by chunk.
+        name = self.entryName(objectName, parameters)
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory, exist_ok=True)
+        columns = {}
+        description = {}
+        for column, (dtype, shape) in schema.items():
+            shape = (rows,) + tuple(shape)
+            columns[column] = open_memmap(os.path.join(directory, f"{column}.npy"), mode="w+",
+                                          dtype=np.dtype(dtype), shape=shape)
+            description[column] = {"dtype": np.dtype(dtype).str, "shape": list(shape)}
+        self.index[name] = {
+            "object": str(objectName),
+            "parameters": parameters,
+            "rows": rows,
+            "columns": description,
+        }
+        self._writeIndex()
+        return columns
+
+    def writeColumns(self, objectName, parameters, data):
+        data = {column: np.asarray(values) for column, values in data.items()}
+        rows = len(next(iter(data.values())))
+        schema = {column: (values.dtype, values.shape[1:]) for column, values in data.items()}
+        columns = self.createColumns(objectName, parameters, schema, rows)
+        for column, values in data.items():
+            columns[column][:] = values
+            columns[column].flush()
+        return self.entryName(objectName, parameters)
+
+    def writeStructured(self, objectName, parameters, records):
+        return self.writeColumns(objectName, parameters, {field: records[field] for field in records.dtype.names})
+
+    def openColumns(self, name, columns=None, mode="r"):
+        entry = self.index[name]
+        directory = os.path.join(self.root, name)
+        return {column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode=mode)
+                for column in (columns or entry["columns"])}
+
+    def find(self, objectName=None, **parameters):
+        matches = []
+        for name, entry in self.index.items():
+            if objectName is not None and entry["object"] != str(objectName):
+                continue
+            if any(entry["parameters"].get(key) != value for key, value in parameters.items()):
+                continue
+            matches.append(name)
+        return sorted(matches)
+
+    def remove(self, name):
+        directory = os.path.join(self.root, name)
+        for column in self.index.pop(name)["columns"]:
+            path = os.path.join(directory, f"{column}.npy")
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+        self._writeIndex()
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from instrumentation import addCount
+
+
+# Bump whenever a cached function's output changes (layout, dtype, units) so
+# stale disk entries are never read back.
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.environ.get("BHA_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "black_hole_analyzer"))
+
+
+def cacheKey(*parameters):
+    normalized = repr((CACHE_VERSION,) + tuple(
+        float(value) if isinstance(value, (int, float, np.number)) and not isinstance(value, bool) else value
+        for value in parameters
+    ))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class SpaceCurveCache:
+    def __init__(self, maxEntries=32, cacheDir=DEFAULT_CACHE_DIR, maxDiskBytes=512 * 1024**2):
+        self.maxEntries = maxEntries
+        self.cacheDir = cacheDir
+        self.maxDiskBytes = maxDiskBytes
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            "memoryHits": self.memoryHits,
+            "diskHits": self.diskHits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+        }
+
+    def _diskPath(self, key):
+        return os.path.join(self.cacheDir, f"{key}.npz")
+
+    def get(self, key):
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.memoryHits += 1
+            return self.entries[key]
+
+        if self.cacheDir is not None:
+            path = self._diskPath(key)
+            try:
+                with np.load(path) as archive:
+                    value = tuple(archive[f"item{i}"][()] for i in range(len(archive.files)))
+                os.utime(path)
+            except (OSError, ValueError, KeyError):
+                value = None
+            if value is not None:
+                self.diskHits += 1
+                self._remember(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            value = self._remember(key, value)
+            if self.cacheDir is not None:
+                self._writeDisk(key, value)
+        return value
+
+    def _remember(self, key, value):
+        value = tuple(self._frozen(item) for item in value)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _frozen(item):
+        if isinstance(item, np.ndarray):
+            item.flags.writeable = False
+        return item
+
+    def _writeDisk(self, key, value):
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            handle, tempPath = tempfile.mkstemp(dir=self.cacheDir, suffix=".tmp")
+            with os.fdopen(handle, "wb") as tempFile:
+                np.savez(tempFile, **{f"item{i}": item for i, item in enumerate(value)})
+            os.replace(tempPath, self._diskPath(key))
+        except OSError:
+            return
+        self._evictDisk()
+
+    def _evictDisk(self):
+        # Other processes share the directory and may delete entries between
+        # the scan and the stat or remove.
+        files = []
+        try:
+            entries = list(os.scandir(self.cacheDir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.endswith(".npz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        totalBytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if totalBytes <= self.maxDiskBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            totalBytes -= size
+
+    def clear(self, disk=False):
+        with self.lock:
+            self.entries.clear()
+        if disk and self.cacheDir is not None and os.path.isdir(self.cacheDir):
+            for entry in os.scandir(self.cacheDir):
+                if entry.name.endswith(".npz"):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+
+spaceCurveCache = SpaceCurveCache()
+
+
+def cachedCall(cache, function, *parameters, **options):
+    key = cacheKey(function.__name__, *parameters)
+    value = cache.get(key)
+    addCount(f"cache.{function.__name__}.{'miss' if value is None else 'hit'}")
+    if value is None:
+        value = function(*parameters, **options)
+        if value is not None:
+            value = cache.put(key, value)
+    return value
@@ -1,10 +1,15 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle, Patch
-from scipy.integrate import solve_ivp
+from matplotlib.collections import LineCollection
 from scipy.interpolate import RegularGridInterpolator
 import matplotlib.widgets as widgets
-from helpers import schwarzchildRadius, spacetimeWarp, geodesicDerivative, solarMassToKg, kgToGeometricUnit
+from helpers import schwarzchildRadius, spacetimeWarp, solarMassToKg, kgToGeometricUnit
+from geodesic_integrator import integrateGeodesics, initialConditionArray
+from spacetime_cache import spaceCurveCache, cachedCall
+from async_recompute import DebouncedRecompute
+from level_of_detail import previewParameters, screenDecimate
+from instrumentation import timed, traced
 
 
 spacetimeData = {
@@ -19,10 +24,41 @@ spacetimeData = {
     "kappa": 0,
     "geoSamples": 2000,
     "geoDelta": 2000,
+    "geoMethod": "adaptive",
+    "precision": "float64",
     "name": "Unknown Mass"
 }
 
 
+PRECISIONS = {"float32": np.float32, "float64": np.float64}
+
+
+def warpGrid(radius, lineCount, schwarzRadius, dtype=np.float64):
+    # The grid is built in Schwarzschild radii, where 1 - rs/r stays well
+    # conditioned near the horizon at any mass, and every step of the warp
+    # runs in place in the requested precision. X and Y are broadcast views
+    # of one coordinate vector and the warped grid is a single (2, n, n)
+    # buffer, so there are no meshgrid or X * warp temporaries. The grid is
+    # scaled back to metres into its own buffer on the way out.
+    unitCoordinates = np.linspace(-radius / schwarzRadius, radius / schwarzRadius, lineCount, dtype=dtype)
+    unitX, unitY = np.meshgrid(unitCoordinates, unitCoordinates, copy=False)
+    warpFactors = np.hypot(unitX, unitY)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.reciprocal(warpFactors, out=warpFactors)
+        np.subtract(1, warpFactors, out=warpFactors)
+        np.sqrt(warpFactors, out=warpFactors)
+    np.nan_to_num(warpFactors, copy=False, nan=0)
+
+    coordinates = np.empty(lineCount, dtype=dtype)
+    np.multiply(unitCoordinates, dtype(schwarzRadius), out=coordinates)
+    X, Y = np.meshgrid(coordinates, coordinates, copy=False)
+    warped = np.empty((2, lineCount, lineCount), dtype=dtype)
+    np.multiply(X, warpFactors, out=warped[0])
+    np.multiply(Y, warpFactors, out=warped[1])
+    return X, Y, warpFactors, warped[0], warped[1]
+
+
+@traced("getSpaceCurveInfo")
 def getSpaceCurveInfo(mass, 
                       radius, 
                       lineCount, 
@@ -31,20 +67,20 @@ def getSpaceCurveInfo(mass,
                       kappa=0, 
                       geoSamples=1000000, 
                       geoDelta=5,
-                      calculateGeo=True
+                      calculateGeo=True,
+                      geoMethod="adaptive",
+                      precision="float64",
+                      cancelled=None
                       ):
-    
+    # precision only applies to the returned visualization arrays; the
+    # geodesic is always integrated in float64.
+    dtype = PRECISIONS[precision]
     massKg = solarMassToKg(mass)
     massGeo = kgToGeometricUnit(massKg)
-
-    coordinates = np.linspace(-radius, radius, lineCount)
-    X, Y = np.meshgrid(coordinates, coordinates)
-    
     schwarzRadius = schwarzchildRadius(massKg)
-    warpFactors = spacetimeWarp(X, Y, 0, 0, massKg, schwarzRadius)
-    warpFactors = np.nan_to_num(warpFactors, nan=0)
-    xWarped = X * warpFactors
-    yWarped = Y * warpFactors
+
+    with timed("getSpaceCurveInfo.warp"):
+        X, Y, warpFactors, xWarped, yWarped = warpGrid(radius, lineCount, schwarzRadius, dtype)
 
     geodesicX = 0
     geodesicY = 0
@@ -52,129 +88,197 @@ def getSpaceCurveInfo(mass,
     geodesicYWarped = 0
 
     if calculateGeo:
-        def geodesicSystem(time, state):
-            x, yPos, vX, vY = state
-            dx, dy, avX, avY = geodesicDerivative(x, yPos, vX, vY, massGeo, kappa)
-            return [dx, dy, avX, avY]
-        
-        initialState = [x0, y0, vX0, vY0]
-        tTotal = (0, geoSamples * geoDelta)
-        tEvaluated = np.linspace(0, geoSamples * geoDelta, geoSamples + 1)
-
-        geodesicSolve = solve_ivp(geodesicSystem, tTotal, initialState, t_eval=tEvaluated, method="RK45")
-        geodesicX = geodesicSolve.y[0]
-        geodesicY = geodesicSolve.y[1]
-        geodesicWarpFactors = spacetimeWarp(geodesicX, geodesicY, 0, 0, massKg, schwarzRadius)
-        geodesicXWarped = geodesicX * geodesicWarpFactors
-        geodesicYWarped = geodesicY * geodesicWarpFactors
+        initialState = initialConditionArray(x0, y0, vX0, vY0, kappa)
+        with timed("getSpaceCurveInfo.integrate"):
+            solution = integrateGeodesics(initialState, massGeo, geoSamples, geoDelta,
+                                          captureRadius=schwarzRadius, method=geoMethod, cancelled=cancelled)
+        if solution is None:
+            return None
+        _, geodesicStates, _, _ = solution
+        geodesicX = geodesicStates[0, 0]
+        geodesicY = geodesicStates[0, 1]
+        with timed("getSpaceCurveInfo.geodesicWarp"):
+            geodesicWarpFactors = spacetimeWarp(geodesicX / schwarzRadius, geodesicY / schwarzRadius, 0, 0, massKg, 1)
+            geodesicXWarped = (geodesicX * geodesicWarpFactors).astype(dtype, copy=False)
+            geodesicYWarped = (geodesicY * geodesicWarpFactors).astype(dtype, copy=False)
         
     return massKg, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, geodesicXWarped, geodesicYWarped
 
 
-def plotSpaceCurve2D(axis, 
-                     massKg, 
-                     schwarzRadius, 
-                     X, Y, 
-                     warpFactors, 
-                     xWarped, yWarped, 
-                     geodesicX, geodesicY, 
-                     name, 
-                     lineCount, 
-                     plotGeodesic, 
-                     plotType):
-    if plotType == "radial":
-        axis.plot(0, color="black", label="Spacetime Surface")
-        axis.contourf(X, Y, warpFactors, levels=lineCount * 2, cmap="Greys", alpha=0.8, antialiased=False)
-
-        axis.set_title(f"{name} (Radial)")
-    
-    elif plotType == "grid":
-        axis.plot(0, color="black", label="Spacetime Surface")
-        for i in range(lineCount):
-            axis.plot(xWarped[i, :], yWarped[i, :], linewidth=1, color="black", alpha=0.3)
-            axis.plot(xWarped[:, i], yWarped[:, i], linewidth=1, color="black", alpha=0.3)
-
-        axis.set_title(f"{name} (Grid)")
-        axis.legend(frameon=True, facecolor="white")
-    
-    if plotGeodesic:
-        axis.plot(geodesicX, geodesicY, color="blue", linewidth=2, label="Geodesic Path")
-
-    circle = Circle((0, 0), schwarzRadius, color="red", fill=False, linestyle="--", linewidth=2, label="Event Horizon", antialiased=False)
-    axis.add_patch(circle)  
-
-    axis.set_xlabel("X Plane (m)")
-    axis.set_ylabel("Y Plane (m)")
-    axis.legend()
-
-
-def plotSpaceCurve3D(axis, 
-                     massKg, 
-                     schwarzRadius, 
-                     X, Y, 
-                     warpFactors, 
-                     xWarped, yWarped, 
-                     geodesicX, geodesicY, 
-                     name, 
-                     lineCount, 
-                     plotGeodesic):
-    
-    axis.set_aspect("equal")
-    axis.set_box_aspect(aspect=None, zoom=0.85)
-    legends = [
-        Patch(facecolor='gray', edgecolor='gray', label='Spacetime Surface')
-    ]
-    axis.plot_surface(X, Y, warpFactors, cmap=plt.cm.Greys, alpha=0.5, antialiased=False)
-    
-    if plotGeodesic:
-        interpWarp = RegularGridInterpolator((Y[:, 0], X[0, :]), warpFactors, bounds_error=False, fill_value=0)
-        points = np.vstack([geodesicY, geodesicX]).T
-        zGeodesic = interpWarp(points)
-        axis.plot3D(geodesicX, geodesicY, zGeodesic + 0.1, color="blue", linewidth=3,
-                    label="Geodesic Path", antialiased=False)
-        legends.append(Patch(facecolor='blue', edgecolor='blue', label='Geodesic Path'))
-
-    u = np.linspace(0, 2 * np.pi, 20)
-    v = np.linspace(0, np.pi, 20)
-    xCircle = schwarzRadius * np.cos(u)
-    yCircle = schwarzRadius * np.sin(u)
-    zCircle = np.ones_like(u)
-    legends.append(Patch(facecolor='red', edgecolor='red', label='Event Horizon'))
-    axis.plot(xCircle, yCircle, zCircle, color="red", antialiased=False)
-    
-    axis.legend(handles=legends, loc='upper right')
-    axis.set_zlim(0, 1)
-    axis.set_xlabel("X Plane (m)")
-    axis.set_ylabel("Y Plane (m)")
-    axis.set_title(f"{name} (3D)")
-    axis.set_zlabel(f"Spacetime Warp Factor")
-
-
-def plotSpaceCurveSubplots(ax1, ax2, ax3):
-    massKg, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, geodesicX, geodesicY = getSpaceCurveInfo(
-        spacetimeData["mass"],
-        spacetimeData["viewRadius"],
-        spacetimeData["gridCount"],
-        spacetimeData["x0"],
-        spacetimeData["y0"],
-        spacetimeData["vX0"],
-        spacetimeData["vY0"],
-        spacetimeData["kappa"],
-        spacetimeData["geoSamples"],
-        spacetimeData["geoDelta"],
-        spacetimeData["plotGeodesic"]
+def cachedSpaceCurveInfo(*parameters, cancelled=None):
+    return cachedCall(spaceCurveCache, getSpaceCurveInfo, *parameters, cancelled=cancelled)
+
+
+def clipToExtent(x, y, z, extent):
+    # 3D axes don't clip lines to their limits, so points of the geodesic
+    # beyond the grid are blanked out instead of drawn outside the box.
+    outside = (np.abs(x) > extent) | (np.abs(y) > extent)
+    return np.where(outside, np.nan, x), np.where(outside, np.nan, y), np.where(outside, np.nan, z)
+
+
+@traced("geodesicHeight")
+def geodesicHeight(X, Y, warpFactors, geodesicX, geodesicY):
+    interpWarp = RegularGridInterpolator((Y[:, 0], X[0, :]), warpFactors, bounds_error=False, fill_value=0)
+    points = np.vstack([geodesicY, geodesicX]).T
+    return interpWarp(points)
+
+
+def spaceCurveParameters(data=spacetimeData):
+    return (
+        data["mass"],
+        data["viewRadius"],
+        data["gridCount"],
+        data["x0"],
+        data["y0"],
+        data["vX0"],
+        data["vY0"],
+        data["kappa"],
+        data["geoSamples"],
+        data["geoDelta"],
+        data["plotGeodesic"],
+        data["geoMethod"],
+        data["precision"]
     )
 
-    ax1.clear()
-    ax2.clear()
-    ax3.clear()
 
-    plotSpaceCurve2D(ax1, massKg, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, geodesicX, geodesicY, spacetimeData["name"], spacetimeData["gridCount"], spacetimeData["plotGeodesic"], "radial")
-    plotSpaceCurve2D(ax2, massKg, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, geodesicX, geodesicY, spacetimeData["name"], spacetimeData["gridCount"], spacetimeData["plotGeodesic"], "grid")
-    plotSpaceCurve3D(ax3, massKg, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, geodesicX, geodesicY, spacetimeData["name"], spacetimeData["gridCount"], spacetimeData["plotGeodesic"])
+class SpaceCurveArtists:
+    # Persistent artists for the three spacetime axes. Grid-dependent artists
+    # are only rebuilt when the mass, view radius, grid size or name change;
+    # the geodesic lines are animated and redrawn by blitting over a cached
+    # background when nothing else moved.
+    def __init__(self, ax1, ax2, ax3):
+        self.figure = ax1.figure
+        self.ax1, self.ax2, self.ax3 = ax1, ax2, ax3
+        self.staticKey = None
+        self.contour = None
+        self.surface = None
+        self.background = None
+        self.backgroundSize = None
+
+        for axis in (ax1, ax2):
+            axis.plot([], [], color="black", label="Spacetime Surface")
+            axis.set_xlabel("X Plane (m)")
+            axis.set_ylabel("Y Plane (m)")
+
+        self.grid = LineCollection([], linewidths=1, colors="black", alpha=0.3)
+        ax2.add_collection(self.grid)
+
+        self.geodesicLines = [
+            axis.plot([], [], color="blue", linewidth=2, label="Geodesic Path", animated=True)[0]
+            for axis in (ax1, ax2)
+        ]
+        self.horizons = []
+        for axis in (ax1, ax2):
+            circle = Circle((0, 0), 1, color="red", fill=False, linestyle="--", linewidth=2, label="Event Horizon", antialiased=False)
+            axis.add_patch(circle)
+            self.horizons.append(circle)
+            axis.legend()
+
+        ax3.set_aspect("equal")
+        ax3.set_box_aspect(aspect=None, zoom=0.85)
+        self.geodesic3D = ax3.plot([], [], [], color="blue", linewidth=3, label="Geodesic Path", antialiased=False, animated=True)[0]
+        self.horizon3D = ax3.plot([], [], [], color="red", antialiased=False)[0]
+        ax3.legend(handles=[
+            Patch(facecolor='gray', edgecolor='gray', label='Spacetime Surface'),
+            Patch(facecolor='blue', edgecolor='blue', label='Geodesic Path'),
+            Patch(facecolor='red', edgecolor='red', label='Event Horizon')
+        ], loc='upper right')
+        ax3.set_zlim(0, 1)
+        ax3.set_xlabel("X Plane (m)")
+        ax3.set_ylabel("Y Plane (m)")
+        ax3.set_zlabel("Spacetime Warp Factor")
+
+        self.animatedArtists = self.geodesicLines + [self.geodesic3D]
+        self.figure.canvas.mpl_connect("draw_event", self._onDraw)
+
+    @traced("SpaceCurveArtists.update")
+    def update(self, spaceCurveInfo, data=spacetimeData):
+        massKg, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, geodesicX, geodesicY = spaceCurveInfo
+        extent = X[0, -1]
+
+        staticKey = (data["mass"], data["viewRadius"], data["gridCount"], data["name"])
+        staticChanged = staticKey != self.staticKey
+        if staticChanged:
+            self.staticKey = staticKey
+            self._updateStatic(schwarzRadius, X, Y, warpFactors, xWarped, yWarped, data)
 
+        for artist in self.animatedArtists:
+            artist.set_visible(bool(data["plotGeodesic"]))
+        if data["plotGeodesic"]:
+            for line, axis in zip(self.geodesicLines, (self.ax1, self.ax2)):
+                line.set_data(*screenDecimate(axis, geodesicX, geodesicY, extent))
+            x3D, y3D = screenDecimate(self.ax3, geodesicX, geodesicY, extent)
+            self.geodesic3D.set_data_3d(*clipToExtent(x3D, y3D, geodesicHeight(X, Y, warpFactors, x3D, y3D) + 0.1, extent))
 
-def spacetimeControls():
+        return staticChanged
+
+    @traced("SpaceCurveArtists.updateStatic")
+    def _updateStatic(self, schwarzRadius, X, Y, warpFactors, xWarped, yWarped, data):
+        extent = X[0, -1]
+        lineCount = data["gridCount"]
+
+        if self.contour is not None:
+            self.contour.remove()
+        self.contour = self.ax1.contourf(X, Y, warpFactors, levels=lineCount * 2, cmap="Greys", alpha=0.8, antialiased=False)
+
+        rows = np.stack((xWarped, yWarped), axis=-1)
+        self.grid.set_segments(np.concatenate((rows, rows.transpose(1, 0, 2))))
+
+        for circle in self.horizons:
+            circle.set_radius(schwarzRadius)
+
+        if self.surface is not None:
+            self.surface.remove()
+        self.surface = self.ax3.plot_surface(X, Y, warpFactors, cmap=plt.cm.Greys, alpha=0.5, antialiased=False)
+
+        u = np.linspace(0, 2 * np.pi, 20)
+        self.horizon3D.set_data_3d(schwarzRadius * np.cos(u), schwarzRadius * np.sin(u), np.ones_like(u))
+
+        for axis in (self.ax1, self.ax2, self.ax3):
+            axis.set_xlim(-extent, extent)
+            axis.set_ylim(-extent, extent)
+        self.ax1.set_title(f"{data['name']} (Radial)")
+        self.ax2.set_title(f"{data['name']} (Grid)")
+        self.ax3.set_title(f"{data['name']} (3D)")
+
+    @traced("SpaceCurveArtists.drawAnimated", category="draw")
+    def _onDraw(self, event):
+        canvas = self.figure.canvas
+        if event is not None and event.renderer is getattr(canvas, "renderer", None):
+            self.background = canvas.copy_from_bbox(self.figure.bbox)
+            self.backgroundSize = canvas.get_width_height(physical=True)
+        renderer = event.renderer if event is not None else canvas.get_renderer()
+        for artist in self.animatedArtists:
+            artist.draw(renderer)
+
+    @traced("SpaceCurveArtists.blit", category="draw")
+    def blit(self):
+        canvas = self.figure.canvas
+        if not canvas.supports_blit or self.background is None or self.backgroundSize != canvas.get_width_height(physical=True):
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        renderer = canvas.get_renderer()
+        for artist in self.animatedArtists:
+            artist.draw(renderer)
+        canvas.blit(self.figure.bbox)
+
+
+def spaceCurveArtists(ax1, ax2, ax3):
+    if getattr(ax1, "spaceCurveArtists", None) is None:
+        ax1.spaceCurveArtists = SpaceCurveArtists(ax1, ax2, ax3)
+    return ax1.spaceCurveArtists
+
+
+def drawSpaceCurveSubplots(ax1, ax2, ax3, spaceCurveInfo, data=spacetimeData):
+    return spaceCurveArtists(ax1, ax2, ax3).update(spaceCurveInfo, data)
+
+
+def plotSpaceCurveSubplots(ax1, ax2, ax3, data=spacetimeData):
+    drawSpaceCurveSubplots(ax1, ax2, ax3, cachedSpaceCurveInfo(*spaceCurveParameters(data)), data)
+
+
+def spacetimeControls(show=True):
     figure = plt.figure(figsize=(12, 7))
     figure.suptitle("Spacetime Curvature Visualization", fontsize=24, fontweight='bold')
     ax1 = figure.add_subplot(1, 3, 1)
@@ -208,8 +312,21 @@ def spacetimeControls():
         spacetimeData["y0"] = int(slidery0.val)
         spacetimeData["vX0"] = float(slidervx0.val)
         spacetimeData["vY0"] = float(slidervy0.val)
-        plotSpaceCurveSubplots(ax1, ax2, ax3)
-        figure.canvas.draw_idle()
+        recompute.request(dict(spacetimeData))
+
+    def computePlot(data, cancelled):
+        if data.get("preview"):
+            return getSpaceCurveInfo(*spaceCurveParameters(data), cancelled=cancelled)
+        return cachedSpaceCurveInfo(*spaceCurveParameters(data), cancelled=cancelled)
+
+    def publishPlot(data, spaceCurveInfo):
+        if drawSpaceCurveSubplots(ax1, ax2, ax3, spaceCurveInfo, data):
+            figure.canvas.draw_idle()
+        else:
+            spaceCurveArtists(ax1, ax2, ax3).blit()
+
+    recompute = DebouncedRecompute(figure, computePlot, publishPlot, preview=previewParameters)
+    figure.spacetimeRecompute = recompute
 
     sliderRadius.on_changed(lambda val: updatePlot(val)) 
     sliderx0.on_changed(lambda val: updatePlot(val)) 
@@ -217,6 +334,8 @@ def spacetimeControls():
     slidervx0.on_changed(lambda val: updatePlot(val)) 
     slidervy0.on_changed(lambda val: updatePlot(val))
 
-    plt.ion()
     plotSpaceCurveSubplots(ax1, ax2, ax3)
-    plt.show(block=False)
\ No newline at end of file
+    if show:
+        plt.ion()
+        plt.show(block=False)
+    return figure
\ No newline at end of file
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from geodesic_integrator import integrateGeodesics
+from helpers import spacetimeWarp
+
+
+def infallingFan(count=64):
+    rng = np.random.default_rng(0)
+    return np.column_stack([rng.uniform(3, 10, count), rng.uniform(-3, 3, count), rng.uniform(-0.9, -0.1, count),
+                            rng.uniform(-0.2, 0.2, count), np.zeros(count)])
+
+
+@pytest.mark.parametrize("method", ["fixed", "adaptive", "binet"])
+def test_captured_trajectories_end_on_the_horizon(method):
+    schwarzRadius = 2.0
+    _, states, captured, _ = integrateGeodesics(infallingFan(), 1.0, 200, 0.5, captureRadius=schwarzRadius,
+                                                method=method)
+    assert captured.any()
+    x, y = states[captured, 0, -1], states[captured, 1, -1]
+    assert np.all(np.hypot(x, y) >= schwarzRadius)
+    np.testing.assert_allclose(np.hypot(x, y), schwarzRadius, rtol=1e-12)
+    assert np.all(np.isfinite(spacetimeWarp(x / schwarzRadius, y / schwarzRadius, 0, 0, None, 1)))
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+manim = pytest.importorskip("manim")
+
+from manim_animations import SCENES, clipConfig, clipPath, sceneForObject
+
+
+@pytest.mark.parametrize("sceneName", list(SCENES))
+def test_clip_path_matches_scene_file_writer(sceneName, tmp_path):
+    expected = clipPath(sceneName, "Sgr A*", str(tmp_path))
+    with manim.tempconfig(clipConfig(sceneName, "Sgr A*", str(tmp_path), "low_quality")):
+        scene = sceneForObject(SCENES[sceneName], "Sgr A*", 6.6)()
+        written = os.path.abspath(scene.renderer.file_writer.movie_file_path)
+    assert written == expected
+
+
+def test_clip_path_relative_output_dir():
+    path = clipPath("TwoDWarp", "Sgr A*", "manim_output")
+    assert os.path.isabs(path)
+    assert path.endswith(os.path.join("manim_output", "videos", "480p15", "Sgr_A_TwoDWarp.mp4"))
@@ -0,0 +1,12 @@
+import numpy as np
+
+from spacetime_curve import warpGrid
+
+
+def test_float32_warp_grid_matches_float64():
+    schwarzRadius = 21000.0
+    reference = warpGrid(200000.0, 201, schwarzRadius, np.float64)
+    reduced = warpGrid(200000.0, 201, schwarzRadius, np.float32)
+    for expected, actual in zip(reference, reduced):
+        assert actual.dtype == np.float32
+        np.testing.assert_allclose(actual, expected, rtol=1e-6, atol=1e-6 * np.abs(expected).max())
@@ -1,54 +1,62 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from constants import GRAV_CONST, LIGHT_SPEED
-from helpers import solarMassToKg
+from helpers import solarMassToKg, schwarzchildRadius, schwarzchildDilation
 
 
-def time_comparison_animation(mass):
-    plt.rcParams["animation.html"] = "jshtml"
-    plt.rcParams['figure.dpi'] = 150  
-
+def build_time_comparison(mass, frame_count=200, animated=True, trace_points=256):
     mass_kg = solarMassToKg(mass)
 
-    Rs = 2 * GRAV_CONST * mass_kg / LIGHT_SPEED**2
+    Rs = schwarzchildRadius(mass_kg)
 
-    tau_values = np.linspace(0.1, 20, 200)
+    tau_values = np.linspace(0.1, 20, frame_count)
 
-    radii_values = np.linspace(20 * Rs, 1.001 * Rs, 200)
+    radii_values = np.linspace(20 * Rs, 1.001 * Rs, frame_count)
 
-    def dilated_time(tau, r, Rs):
-        factor = np.sqrt(1 - Rs / r)
-        return tau / factor
+    dilated_values = tau_values / schwarzchildDilation(mass_kg, radii_values)
 
     fig, ax = plt.subplots(figsize=(8, 5))
 
+    ax.set_xlim(0, tau_values[-1] * 1.2)
+    ax.set_ylim(0, dilated_values[-1] * 1.2)
+    ax.set_xlabel('Proper Time (s)')
+    ax.set_ylabel('Dilated Time (s)')
+    ax.set_title('Dilated Time vs Proper Time as Distance to Black Hole Decreases')
+    ax.grid(True)
+
+    trace, = ax.plot([], [], 'r:', alpha=0.6, animated=animated)
+    point, = ax.plot([], [], 'ro', animated=animated)
+    status = ax.text(0.5, 0.96, '', transform=ax.transAxes, ha='center', va='top', animated=animated,
+                     bbox=dict(facecolor='white', edgecolor='none', alpha=0.8))
+
+    def init():
+        trace.set_data([], [])
+        point.set_data([], [])
+        status.set_text('')
+        return trace, point, status
+
     def animate(i):
-        ax.cla()
-        tau = tau_values[i]
-        r = radii_values[i]
-        dt = dilated_time(tau, r, Rs)
-        
-        trace_tau = tau_values[:i+1]
-        trace_dt = [dilated_time(tau_values[j], radii_values[j], Rs) for j in range(i+1)]
-
-        ax.plot(trace_tau, trace_dt, 'r:', alpha=0.6)
-        ax.plot(tau, dt, 'ro')
-
-        ax.set_xlim(0, tau_values[-1] * 1.2)
-        max_dt = dilated_time(tau_values[-1], radii_values[-1], Rs) * 1.2
-        ax.set_ylim(0, max_dt)
-        ax.set_xlabel('Proper Time (s)')
-        ax.set_ylabel('Dilated Time (s)')
-        ax.set_title('Dilated Time vs Proper Time as Distance to Black Hole Decreases')
-        ax.grid(True)
-        ax.text(0.5, 1.07,
-                f'Radius: {r/Rs:.3f} Rs  |  Proper Time: {tau:.2f} s | Dilated Time: {dt:.2f} s',
-                transform=ax.transAxes, ha='center')
-
-    ani = animation.FuncAnimation(fig, animate, frames=len(tau_values),
-                                interval=100, repeat=True)
-    
-    plt.show()
-    
-    return ani
\ No newline at end of file
+        # A strided view of the precomputed curve ending at frame i, so the
+        # trace never holds more than trace_points points whatever i is.
+        stride = i // trace_points + 1
+        trace.set_data(tau_values[i::-stride], dilated_values[i::-stride])
+        point.set_data(tau_values[i:i+1], dilated_values[i:i+1])
+        status.set_text(f'Radius: {radii_values[i]/Rs:.3f} Rs  |  Proper Time: {tau_values[i]:.2f} s | Dilated Time: {dilated_values[i]:.2f} s')
+        return trace, point, status
+
+    return fig, init, animate
+
+
+def time_comparison_animation(mass, frame_count=200, interval=100, show=True):
+    plt.rcParams["animation.html"] = "jshtml"
+    plt.rcParams['figure.dpi'] = 150
+
+    fig, init, animate = build_time_comparison(mass, frame_count)
+
+    ani = animation.FuncAnimation(fig, animate, frames=frame_count, init_func=init,
+                                interval=interval, blit=True, repeat=True)
+
+    if show:
+        plt.show()
+
+    return ani
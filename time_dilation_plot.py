@@ -1,14 +1,20 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from helpers import schwarzchildDilation, schwarzchildRadius, solarMassToKg
+from instrumentation import traced
+from adaptive_sampling import adaptiveRadii, adaptiveSettings
 
 
-def plotTimeDilation(mass=7.2301112487166, name="Unknown Mass", minRadius=0, maxRadius=100000, sampleRate=100):
+@traced("plotTimeDilation")
+def plotTimeDilation(mass=7.2301112487166, name="Unknown Mass", minRadius=0, maxRadius=100000, sampleRate=100, show=True, adaptive=False):
     massKg = solarMassToKg(mass)
-    radii = np.linspace(minRadius, maxRadius, sampleRate)
-    dilationFactors = []
-    for radius in radii:
-        dilationFactors.append(schwarzchildDilation(massKg, radius))
+    if adaptive:
+        # sampleRate seeds the log-spaced grid; refinement adds points near the horizon.
+        radii, dilationFactors = adaptiveRadii(lambda radii: schwarzchildDilation(massKg, radii), schwarzchildRadius(massKg),
+                                               minRadius, maxRadius, dict(adaptiveSettings, initialSamples=sampleRate))
+    else:
+        radii = np.linspace(minRadius, maxRadius, sampleRate)
+        dilationFactors = schwarzchildDilation(massKg, radii)
         
     figure = plt.figure()
     plt.plot(radii, dilationFactors, label="Time Dilation Factor")
@@ -18,4 +24,6 @@ def plotTimeDilation(mass=7.2301112487166, name="Unknown Mass", minRadius=0, max
     plt.ylabel("Time Dilation Factor (dtr/dt∞)")
     plt.legend()
     plt.grid()
-    plt.show(block=False)
\ No newline at end of file
+    if show:
+        plt.show(block=False)
+    return figure
\ No newline at end of file
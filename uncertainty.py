@@ -0,0 +1,218 @@
+import argparse
+import csv
+import math
+
+import numpy as np
+
+from helpers import schwarzchildRadius, schwarzchildDilation, gravitationalRedshift, properTime, solarMassToKg
+from catalog import Catalog
+from instrumentation import traced
+
+
+uncertaintySettings = {
+    "sampleCount": 1000000,
+    "interactiveSampleCount": 20000,
+    "chunkSize": 1000000,
+    "radiusFactors": (1.5, 3, 10),
+    "properTimeInterval": 1.0,
+    "quantiles": (0.025, 0.16, 0.5, 0.84, 0.975),
+    "histogramBins": 65536,
+    "tailSigma": 9,
+    "seed": 0
+}
+
+QUANTITIES = ("schwarzRadius", "dilation", "redshift", "properTime")
+# Direction of each quantity in mass, at a fixed radius outside the horizon.
+INCREASING = {"schwarzRadius": True, "dilation": False, "redshift": True, "properTime": False}
+
+
+def splitNormalSamples(rng, center, plusError, minusError, size):
+    # Split normal with the catalog's asymmetric errors: each half is a
+    # half-normal with its own width, picked in proportion to that width so
+    # the density is continuous at the center.
+    upper = rng.random(size) < plusError / (plusError + minusError)
+    spread = np.abs(rng.standard_normal(size))
+    return center + np.where(upper, plusError * spread, -minusError * spread)
+
+
+def splitNormalBounds(center, plusError, minusError, tailSigma=9):
+    return center - tailSigma * minusError, center + tailSigma * plusError
+
+
+def derivedQuantities(mass, radii, properTimeInterval=1.0):
+    # mass is in the units of the catalog's mass column as used everywhere
+    # else (main.py passes it straight to solarMassToKg); radii are fixed
+    # distances in metres, one column each.
+    massKg = solarMassToKg(np.asarray(mass, dtype=float))[:, None]
+    radii = np.asarray(radii, dtype=float)[None, :]
+    return {
+        "schwarzRadius": schwarzchildRadius(massKg)[:, 0],
+        "dilation": schwarzchildDilation(massKg, radii),
+        "redshift": gravitationalRedshift(massKg, radii),
+        "properTime": properTime(properTimeInterval, massKg, radii)
+    }
+
+
+class StreamingSummary:
+    # Running moments and a fixed-range histogram per column, so quantiles of
+    # any number of samples come out of bounded memory. Values beyond the
+    # range land in the edge bins; NaNs are left out of their column.
+    def __init__(self, low, high, bins=65536):
+        self.low = np.atleast_1d(np.asarray(low, dtype=float))
+        self.high = np.atleast_1d(np.asarray(high, dtype=float))
+        self.width = np.where(self.high > self.low, self.high - self.low, 1.0)
+        self.bins = bins
+        self.counts = np.zeros((self.low.size, bins), dtype=np.int64)
+        self.total = np.zeros(self.low.size, dtype=np.int64)
+        self.sum = np.zeros(self.low.size)
+        self.sumSquares = np.zeros(self.low.size)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).reshape(len(values), -1)
+        valid = np.isfinite(values)
+        shift = np.where(valid, values - self.low, 0)
+        self.total += valid.sum(axis=0)
+        self.sum += shift.sum(axis=0)
+        self.sumSquares += (shift**2).sum(axis=0)
+        index = np.clip((shift / self.width * self.bins).astype(np.int64), 0, self.bins - 1)
+        for column in range(values.shape[1]):
+            self.counts[column] += np.bincount(index[valid[:, column], column], minlength=self.bins)
+
+    def mean(self):
+        with np.errstate(invalid='ignore'):
+            return self.low + self.sum / self.total
+
+    def std(self):
+        with np.errstate(invalid='ignore'):
+            shiftMean = self.sum / self.total
+            return np.sqrt(np.maximum(self.sumSquares / self.total - shiftMean**2, 0))
+
+    def _cumulative(self, column):
+        with np.errstate(invalid='ignore'):
+            return (np.concatenate(([0], np.cumsum(self.counts[column]) / self.total[column])),
+                    self.low[column] + np.arange(self.bins + 1) / self.bins * self.width[column])
+
+    def fraction(self, values, column=0):
+        # Share of the column's samples below each value.
+        cumulative, edges = self._cumulative(column)
+        return np.interp(values, edges, cumulative)
+
+    def quantiles(self, levels):
+        result = np.empty((self.low.size, len(levels)))
+        for column in range(self.low.size):
+            # Interpolate linearly inside the bin the quantile falls in.
+            cumulative, edges = self._cumulative(column)
+            result[column] = np.interp(levels, cumulative, edges)
+        return result
+
+
+def horizonMass(radii):
+    # Mass (in the catalog's units) whose Schwarzschild radius is each radius.
+    return np.asarray(radii, dtype=float) / schwarzchildRadius(solarMassToKg(1.0))
+
+
+@traced("propagateUncertainty")
+def propagateUncertainty(center, plusError, minusError, radii, settings=uncertaintySettings):
+    rng = np.random.default_rng(settings["seed"])
+    low, high = splitNormalBounds(center, plusError, minusError, settings["tailSigma"])
+    # Non-positive masses are rejected, so the histogram starts above 0.
+    low = max(low, np.nextafter(0, 1))
+    radii = np.asarray(radii, dtype=float)
+    massSummary = StreamingSummary(low, high, settings["histogramBins"])
+    # Quantities only keep moments here, shifted by their central value for
+    # stability; samples where a radius is inside the horizon are masked.
+    centerValues = derivedQuantities([center], radii, settings["properTimeInterval"])
+    summaries = {name: StreamingSummary(values[0], values[0], 1) for name, values in centerValues.items()}
+    inside = horizonMass(radii)
+
+    remaining = int(settings["sampleCount"])
+    while remaining > 0:
+        size = min(remaining, int(settings["chunkSize"]))
+        masses = splitNormalSamples(rng, center, plusError, minusError, size)
+        masses = masses[masses > 0]
+        massSummary.add(masses)
+        subHorizon = masses[:, None] > inside[None, :]
+        for name, values in derivedQuantities(masses, radii, settings["properTimeInterval"]).items():
+            summaries[name].add(values if name == "schwarzRadius" else np.where(subHorizon, np.nan, values))
+        remaining -= size
+
+    # Every quantity is monotonic in mass wherever it is defined (positive
+    # mass, radius outside the horizon), so its quantiles are the quantity at
+    # the matching quantiles of the masses for which it is defined.
+    levels = np.asarray(settings["quantiles"], dtype=float)
+    defined = {"schwarzRadius": np.ones(1), **{name: massSummary.fraction(inside) for name in QUANTITIES[1:]}}
+    results = {}
+    for name, summary in summaries.items():
+        quantiles = np.full((defined[name].size, levels.size), np.nan)
+        for column, share in enumerate(defined[name]):
+            if share > 0:
+                massLevels = (levels if INCREASING[name] else 1 - levels) * share
+                values = derivedQuantities(massSummary.quantiles(massLevels)[0], radii, settings["properTimeInterval"])[name]
+                quantiles[column] = values if values.ndim == 1 else values[:, column]
+        results[name] = {"mean": summary.mean(), "std": summary.std(), "quantiles": quantiles}
+    return results
+
+
+def massErrors(row):
+    try:
+        plusError = float(row["+err(log M_BH)"])
+        minusError = float(row["-err(log M_BH)"])
+    except ValueError:
+        return None
+    if not (plusError > 0 and minusError > 0):
+        return None
+    return plusError, minusError
+
+
+def catalogErrors(catalog):
+    rows = catalog.rows(range(len(catalog)))
+    for name, center, row in zip(catalog.names.tolist(), catalog.logMass.tolist(), rows):
+        errors = massErrors(row)
+        if errors is not None and math.isfinite(center):
+            yield (name, center) + errors
+
+
+def objectUncertainty(center, plusError, minusError, settings=uncertaintySettings):
+    # Dilation, redshift and proper time are evaluated at fixed distances set
+    # by the central Schwarzschild radius.
+    sRadius = schwarzchildRadius(solarMassToKg(center))
+    radii = sRadius * np.asarray(settings["radiusFactors"], dtype=float)
+    return radii, propagateUncertainty(center, plusError, minusError, radii, settings)
+
+
+def catalogUncertainty(catalogPath="mbh.csv", settings=uncertaintySettings):
+    for name, center, plusError, minusError in catalogErrors(Catalog(catalogPath)):
+        radii, results = objectUncertainty(center, plusError, minusError, settings)
+        yield name, center, radii, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo propagation of catalog mass errors.")
+    parser.add_argument("--catalog", default="mbh.csv")
+    parser.add_argument("--output", default="uncertainty.csv")
+    parser.add_argument("--samples", type=float, default=uncertaintySettings["sampleCount"])
+    parser.add_argument("--chunk-size", type=float, default=uncertaintySettings["chunkSize"])
+    parser.add_argument("--radius-factors", type=float, nargs="+", default=list(uncertaintySettings["radiusFactors"]),
+                        help="evaluation distances in units of the central Schwarzschild radius")
+    parser.add_argument("--seed", type=int, default=uncertaintySettings["seed"])
+    args = parser.parse_args()
+
+    settings = dict(uncertaintySettings, sampleCount=int(args.samples), chunkSize=int(args.chunk_size),
+                    radiusFactors=tuple(args.radius_factors), seed=args.seed)
+    levels = settings["quantiles"]
+    with open(args.output, "w", newline="") as outputFile:
+        writer = csv.writer(outputFile)
+        writer.writerow(["Object", "log M_BH", "Quantity", "Radius (m)", "Mean", "Std"] + [f"q{level:g}" for level in levels])
+        for name, center, radii, results in catalogUncertainty(args.catalog, settings):
+            for quantity in QUANTITIES:
+                result = results[quantity]
+                columnRadii = [""] if quantity == "schwarzRadius" else radii
+                for column, radius in enumerate(columnRadii):
+                    writer.writerow([name, center, quantity, radius, result["mean"][column], result["std"][column]]
+                                    + list(result["quantiles"][column]))
+            median = results["schwarzRadius"]["quantiles"][0][levels.index(0.5)]
+            print(f"{name}: Schwarzchild radius median {median:.6g} m")
+
+
+if __name__ == "__main__":
+    main()